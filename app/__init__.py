@@ -6,8 +6,8 @@ import os
 from dotenv import load_dotenv
 from flask_mail import Mail
 from flask_dramatiq import Dramatiq
-from dramatiq.brokers.redis import RedisBroker
-import dramatiq
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app.metrics import InstrumentedQueuePool
 
 
 db = SQLAlchemy()
@@ -15,6 +15,7 @@ migrate = Migrate()
 load_dotenv()
 login_manager = LoginManager()
 mail = Mail()
+dramatiq = Dramatiq()
 
 
 def create_app(test_config=None):
@@ -24,30 +25,229 @@ def create_app(test_config=None):
         app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
         app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
             "SQLALCHEMY_DATABASE_URI")
+        app.config["DRAMATIQ_BROKER"] = "dramatiq.brokers.redis:RedisBroker"
+        app.config["DRAMATIQ_BROKER_URL"] = os.environ.get(
+            "REDIS_URL", "redis://127.0.0.1:6379/0")
     else:
         app.config["TESTING"] = True
         app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
             "SQLALCHEMY_TEST_DATABASE_URI")
+        # Jobs are queued in memory and run by a test worker
+        app.config["DRAMATIQ_BROKER"] = "dramatiq.brokers.stub:StubBroker"
+
+    # Size the pool for the threads of one gunicorn or Dramatiq process.
+    # Connections are checked before use and recycled before the server or
+    # a proxy drops them.
+    engine_options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 5)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+    }
+    if (app.config["SQLALCHEMY_DATABASE_URI"] or "").startswith("postgresql"):
+        # Milliseconds, a runaway query can't hold a connection forever
+        engine_options["connect_args"] = {
+            "options": f"-c statement_timeout={int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000))}"
+        }
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
 
     app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY")
 
-    app.config["MAIL_SERVER"] = "smtp.gmail.com"
-    app.config["MAIL_PORT"] = 587
-    app.config["MAIL_USE_TLS"] = True
+    # Point these at a local SMTP sink to test the mail worker
+    app.config["MAIL_SERVER"] = os.environ.get("MAIL_SERVER", "smtp.gmail.com")
+    app.config["MAIL_PORT"] = int(os.environ.get("MAIL_PORT", 587))
+    app.config["MAIL_USE_TLS"] = os.environ.get(
+        "MAIL_USE_TLS", "true").lower() == "true"
     app.config["MAIL_USERNAME"] = os.environ.get("MAIL_USERNAME")
     app.config["MAIL_PASSWORD"] = os.environ.get("MAIL_PASSWORD")
     app.config["MAIL_DEFAULT_SENDER"] = os.environ.get("MAIL_USERNAME")
 
-    redis_broker = RedisBroker(url="redis://127.0.0.1:6379/0")
-    dramatiq.set_broker(redis_broker)
+    # Uploaded PDFs wait here until a worker picks up the conversion job.
+    # Web and worker processes must share this directory.
+    app.config["UPLOAD_FOLDER"] = os.environ.get(
+        "UPLOAD_FOLDER", os.path.join(app.instance_path, "uploads"))
+
+    # Largest PDF accepted for conversion. Werkzeug spools bodies to a temp
+    # file, so large uploads don't sit in memory on the web tier.
+    app.config["MAX_PDF_SIZE"] = int(os.environ.get(
+        "MAX_PDF_SIZE", 100 * 1024 * 1024))
+    # A batch upload takes up to BATCH_MAX_FILES PDFs, loose or in a ZIP,
+    # and BATCH_MAX_SIZE bytes of PDFs in total
+    app.config["BATCH_MAX_FILES"] = int(os.environ.get("BATCH_MAX_FILES", 50))
+    app.config["BATCH_MAX_SIZE"] = int(os.environ.get(
+        "BATCH_MAX_SIZE", 500 * 1024 * 1024))
+    app.config["MAX_CONTENT_LENGTH"] = max(
+        app.config["MAX_PDF_SIZE"], app.config["BATCH_MAX_SIZE"]) + 1024 * 1024
+
+    # Converted audio is stored by content hash, see app/storage.py
+    app.config["AUDIO_STORAGE_BACKEND"] = os.environ.get(
+        "AUDIO_STORAGE_BACKEND", "local")
+    app.config["AUDIO_STORAGE_PATH"] = os.environ.get(
+        "AUDIO_STORAGE_PATH", os.path.join(app.instance_path, "audio"))
+    app.config["AUDIO_STORAGE_S3_BUCKET"] = os.environ.get(
+        "AUDIO_STORAGE_S3_BUCKET")
+    app.config["AUDIO_STORAGE_S3_PREFIX"] = os.environ.get(
+        "AUDIO_STORAGE_S3_PREFIX", "audio/")
+    app.config["AUDIO_STORAGE_S3_ENDPOINT_URL"] = os.environ.get(
+        "AUDIO_STORAGE_S3_ENDPOINT_URL")
+
+    # Converted audio is kept until it is least recently used and the
+    # cache is over budget, or it is older than the TTL (in seconds)
+    app.config["RESULT_CACHE_MAX_BYTES"] = int(os.environ.get(
+        "RESULT_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+    app.config["RESULT_CACHE_TTL"] = int(os.environ.get(
+        "RESULT_CACHE_TTL", 24 * 60 * 60))
+
+    # Pages with fewer than OCR_MIN_CHARS word characters are treated as
+    # scanned and run through Tesseract, if pytesseract is installed
+    app.config["OCR_ENABLED"] = os.environ.get(
+        "OCR_ENABLED", "true").lower() == "true"
+    app.config["OCR_MIN_CHARS"] = int(os.environ.get("OCR_MIN_CHARS", 20))
+    app.config["OCR_LANGUAGE"] = os.environ.get("OCR_LANGUAGE", "eng")
+    # Pools are per Dramatiq worker process, and Dramatiq already starts a
+    # process per CPU by default
+    app.config["OCR_WORKERS"] = int(os.environ.get("OCR_WORKERS", 1))
+    app.config["OCR_CACHE_PATH"] = os.environ.get(
+        "OCR_CACHE_PATH", os.path.join(app.instance_path, "ocr"))
+    # Cached pages not used for this many seconds are removed by the sweep
+    app.config["OCR_CACHE_TTL"] = int(os.environ.get(
+        "OCR_CACHE_TTL", 30 * 24 * 60 * 60))
+
+    # Audio downloads are cached by clients for AUDIO_DOWNLOAD_MAX_AGE
+    # seconds. Behind nginx, set AUDIO_ACCEL_REDIRECT_PREFIX to an internal
+    # location aliased to AUDIO_STORAGE_PATH, behind Apache or lighttpd set
+    # USE_X_SENDFILE, and the web server sends the file instead of Python.
+    app.config["AUDIO_DOWNLOAD_MAX_AGE"] = int(os.environ.get(
+        "AUDIO_DOWNLOAD_MAX_AGE", 365 * 24 * 60 * 60))
+    app.config["AUDIO_ACCEL_REDIRECT_PREFIX"] = os.environ.get(
+        "AUDIO_ACCEL_REDIRECT_PREFIX")
+    app.config["USE_X_SENDFILE"] = os.environ.get(
+        "USE_X_SENDFILE", "false").lower() == "true"
+    # Number of proxies in front of the app whose X-Forwarded-For is
+    # trusted, so the client IP limits see the real client behind nginx
+    app.config["PROXY_FIX_X_FOR"] = int(os.environ.get("PROXY_FIX_X_FOR", 0))
+
+    # Synthesized audio is encoded with ffmpeg, "wav" stores it as rendered
+    app.config["AUDIO_FORMAT"] = os.environ.get("AUDIO_FORMAT", "mp3")
+    app.config["AUDIO_BITRATE"] = os.environ.get("AUDIO_BITRATE", "64k")
+    app.config["FFMPEG_PATH"] = os.environ.get("FFMPEG_PATH", "ffmpeg")
+
+    app.config["TTS_VOICE"] = os.environ.get("TTS_VOICE")
+    app.config["TTS_RATE"] = os.environ.get("TTS_RATE")
+
+    # Text is synthesized in chunks so audio can be streamed while the rest
+    # of the document is still rendering
+    app.config["TTS_CHUNK_MAX_CHARS"] = int(os.environ.get(
+        "TTS_CHUNK_MAX_CHARS", 2000))
+    # With more than one worker, chunks are rendered in parallel by a pool of
+    # pre-initialized engines in every Dramatiq worker process
+    app.config["TTS_WORKERS"] = int(os.environ.get("TTS_WORKERS", 1))
+    app.config["STREAM_POLL_INTERVAL"] = float(os.environ.get(
+        "STREAM_POLL_INTERVAL", 0.5))
+    app.config["SEGMENT_RETENTION"] = int(os.environ.get(
+        "SEGMENT_RETENTION", 10 * 60))
+
+    # Cache for the user row loaded on every authenticated request
+    app.config["USER_CACHE_MAX_ENTRIES"] = int(os.environ.get(
+        "USER_CACHE_MAX_ENTRIES", 10000))
+    app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 30))
+    app.config["USER_CACHE_REDIS"] = os.environ.get(
+        "USER_CACHE_REDIS", "true").lower() == "true"
+    app.config["USER_CACHE_REDIS_TTL"] = int(os.environ.get(
+        "USER_CACHE_REDIS_TTL", 300))
+
+    # Password hashes are computed in a process pool, 0 workers hashes in
+    # the request thread. The pool is per web process, like the worker
+    # pools. Stored hashes with other parameters are upgraded on the next
+    # successful login.
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get(
+        "PASSWORD_HASH_METHOD", "scrypt")
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get(
+        "PASSWORD_HASH_WORKERS", 1))
+    app.config["PASSWORD_HASH_MAX_QUEUE"] = int(os.environ.get(
+        "PASSWORD_HASH_MAX_QUEUE", 64))
+
+    # Documents with more pages than this are scheduled as large jobs, at
+    # most LARGE_MAX_IN_FLIGHT of them are queued or running at a time
+    app.config["CONVERSION_SMALL_MAX_PAGES"] = int(os.environ.get(
+        "CONVERSION_SMALL_MAX_PAGES", 50))
+    app.config["CONVERSION_LARGE_MAX_IN_FLIGHT"] = int(os.environ.get(
+        "CONVERSION_LARGE_MAX_IN_FLIGHT", 4))
+    # Conversions are rendered and checkpointed in parts of this many pages
+    app.config["CONVERSION_PART_PAGES"] = int(os.environ.get(
+        "CONVERSION_PART_PAGES", 10))
+
+    # Token buckets for conversion submissions, per user and per client IP.
+    # BURST is the bucket size, PER_MINUTE the refill rate.
+    app.config["RATE_LIMIT_REDIS"] = os.environ.get(
+        "RATE_LIMIT_REDIS", "true").lower() == "true"
+    app.config["CONVERSION_USER_BURST"] = int(os.environ.get(
+        "CONVERSION_USER_BURST", 5))
+    app.config["CONVERSION_USER_PER_MINUTE"] = float(os.environ.get(
+        "CONVERSION_USER_PER_MINUTE", 2))
+    app.config["CONVERSION_IP_BURST"] = int(os.environ.get(
+        "CONVERSION_IP_BURST", 20))
+    app.config["CONVERSION_IP_PER_MINUTE"] = float(os.environ.get(
+        "CONVERSION_IP_PER_MINUTE", 10))
+    # New conversions are turned away while this many jobs are waiting
+    app.config["CONVERSION_MAX_QUEUE_DEPTH"] = int(os.environ.get(
+        "CONVERSION_MAX_QUEUE_DEPTH", 200))
+    app.config["CONVERSION_BUSY_RETRY_AFTER"] = int(os.environ.get(
+        "CONVERSION_BUSY_RETRY_AFTER", 30))
+
+    # Finished and failed jobs are kept for JOB_RETENTION seconds. A sweep
+    # every JOB_SWEEP_INTERVAL seconds deletes the expired ones with their
+    # leftover files, 0 turns it off.
+    app.config["JOB_RETENTION"] = int(os.environ.get(
+        "JOB_RETENTION", 30 * 24 * 60 * 60))
+    app.config["JOB_SWEEP_INTERVAL"] = int(os.environ.get(
+        "JOB_SWEEP_INTERVAL", 60 * 60))
+    app.config["JOB_SWEEP_BATCH_SIZE"] = int(os.environ.get(
+        "JOB_SWEEP_BATCH_SIZE", 500))
+
+    if test_config:
+        app.config.from_mapping(test_config)
+
+    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+
+    if app.config["PROXY_FIX_X_FOR"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_FIX_X_FOR"])
 
     from app.models.user import User
+    from app.models.conversion_job import ConversionJob
+    from app.models.conversion_batch import ConversionBatch
 
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     mail.init_app(app)
-    dramatiq_extension = Dramatiq(app)
+    dramatiq.init_app(app)
+
+    from app.synthesis import TTSEngineMiddleware
+    dramatiq.broker.add_middleware(TTSEngineMiddleware(app))
+
+    from app.retention import JobSweeperMiddleware
+    dramatiq.broker.add_middleware(JobSweeperMiddleware(app))
+
+    from app.user_cache import init_user_cache
+    init_user_cache(app, dramatiq.broker)
+
+    from app.hashing import init_password_hasher
+    init_password_hasher(app)
+
+    from app.rate_limit import init_rate_limiter
+    init_rate_limiter(app, dramatiq.broker)
+
+    from app.metrics import init_metrics
+    with app.app_context():
+        init_metrics(app, db.engine, dramatiq.broker)
+
+    from app.storage import init_audio_storage
+    from app.cache import init_result_cache
+    audio_storage = init_audio_storage(app)
+    init_result_cache(app, audio_storage)
 
     from .routes import users_bp
     app.register_blueprint(users_bp)
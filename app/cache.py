@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+from flask import current_app
+from app.metrics import RESULT_CACHE_LOOKUPS
+
+
+class ResultCache:
+    # Conversion results live in the audio storage, keyed by audio_key().
+    # The storage itself is the index, so web and worker processes share
+    # one cache without extra coordination.
+
+    def __init__(self, storage, max_bytes, ttl):
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bytes stored as of the last walk of the storage, plus what this
+        # process stored since. Other processes store audio too, so the
+        # periodic sweep walks the storage again and corrects it.
+        self.total_bytes = None
+        self.lock = threading.Lock()
+
+    def is_expired(self, created, now=None):
+        return self.ttl and (now or time.time()) - created > self.ttl
+
+    def get(self, key):
+        stat = self.storage.stat(key)
+
+        if stat and self.is_expired(stat[1]):
+            self.storage.delete(key)
+            stat = None
+
+        with self.lock:
+            if stat:
+                self.hits += 1
+            else:
+                self.misses += 1
+        RESULT_CACHE_LOOKUPS.labels(result="hit" if stat else "miss").inc()
+
+        if stat:
+            self.storage.touch(key)
+
+        return bool(stat)
+
+    def put(self, key, file_path):
+        size = os.path.getsize(file_path)
+        self.storage.save_file(key, file_path)
+
+        # Only walk the storage when it may have gone over the limit
+        with self.lock:
+            if self.total_bytes is not None:
+                self.total_bytes += size
+            over_limit = self.total_bytes is None or self.total_bytes > self.max_bytes
+
+        if over_limit:
+            self.evict(keep=key)
+
+    def evict(self, keep=None):
+        now = time.time()
+        entries = []
+        total_bytes = 0
+
+        for key, size, created, last_access in self.storage.entries():
+            if key != keep and self.is_expired(created, now):
+                self.remove(key)
+                continue
+            entries.append((last_access, key, size))
+            total_bytes += size
+
+        # Least recently used first
+        entries.sort()
+
+        for _, key, size in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            total_bytes -= size
+
+        with self.lock:
+            self.total_bytes = total_bytes
+
+    def remove(self, key):
+        try:
+            self.storage.delete(key)
+        except OSError as e:
+            # A concurrent eviction in another process already removed it
+            logging.warning(f"Could not evict cached audio {key}: {e}")
+            return
+
+        with self.lock:
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+
+def init_result_cache(app, storage):
+    cache = ResultCache(
+        storage,
+        max_bytes=app.config["RESULT_CACHE_MAX_BYTES"],
+        ttl=app.config["RESULT_CACHE_TTL"]
+    )
+    app.extensions["result_cache"] = cache
+
+    return cache
+
+
+def get_result_cache():
+    return current_app.extensions["result_cache"]
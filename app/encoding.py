@@ -0,0 +1,171 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+from app.synthesis import SegmentConcatenator
+
+# format: (file extension, mimetype, ffmpeg output options). Parts are
+# streamed to clients back to back, so MP3 parts are written without ID3
+# and Xing headers. The finished file is remuxed from the parts in one go,
+# see join_parts().
+AUDIO_FORMATS = {
+    "mp3": ("mp3", "audio/mpeg", ["-codec:a", "libmp3lame", "-write_xing", "0",
+                                  "-id3v2_version", "0", "-map_metadata", "-1", "-f", "mp3"]),
+    "opus": ("ogg", "audio/ogg", ["-codec:a", "libopus", "-application", "voip",
+                                  "-map_metadata", "-1", "-f", "ogg"]),
+    "wav": ("wav", "audio/wav", None)
+}
+
+SAMPLE_FORMATS = {1: "u8", 2: "s16le", 4: "s32le"}
+# (channels, sample width, frame rate) of the PCM sent to ffmpeg when the
+# first segment isn't a WAV file
+DEFAULT_PCM_PARAMS = (1, 2, 22050)
+
+
+def get_audio_format(audio_format):
+    # Jobs converted before formats were configurable have no format stored
+    try:
+        return AUDIO_FORMATS[audio_format or "mp3"]
+    except KeyError:
+        raise ValueError(f"Unknown audio format: {audio_format}")
+
+
+def can_stream_parts(audio_format):
+    # MP3 frames can be played back to back, several WAV or Ogg files in one
+    # response can't, most players stop after the first of them
+    return (audio_format or "mp3") == "mp3"
+
+
+class AudioEncoder:
+    # Pipes the PCM frames of segments into ffmpeg as they are rendered, so
+    # encoding overlaps with synthesis and the uncompressed part is never
+    # written to disk. Same interface as SegmentConcatenator.
+
+    def __init__(self, output_path, audio_format="mp3", bitrate="64k", ffmpeg="ffmpeg"):
+        self.output_path = output_path
+        self.output_options = get_audio_format(audio_format)[2]
+        self.bitrate = bitrate
+        self.ffmpeg = ffmpeg
+        self.process = None
+        self.params = None
+
+    def start(self, channels, sample_width, frame_rate):
+        command = [
+            self.ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", SAMPLE_FORMATS[sample_width], "-ar", str(frame_rate),
+            "-ac", str(channels), "-i", "pipe:0",
+            *self.output_options, "-b:a", self.bitrate, self.output_path
+        ]
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.params = (channels, sample_width, frame_rate)
+
+    def append(self, segment_path, chunk_frames=64 * 1024):
+        if os.path.getsize(segment_path) == 0:
+            return
+
+        with open(segment_path, "rb") as segment:
+            if segment.read(4) != b"RIFF":
+                # The macOS driver writes AIFF
+                self.append_decoded(segment_path)
+                return
+
+        with wave.open(segment_path, "rb") as segment:
+            params = (segment.getnchannels(), segment.getsampwidth(),
+                      segment.getframerate())
+            if self.process is None:
+                self.start(*params)
+            elif params != self.params:
+                raise ValueError(
+                    f"Segment format {params} differs from {self.params}")
+
+            for frames in iter(lambda: segment.readframes(chunk_frames), b""):
+                self.process.stdin.write(frames)
+
+    def append_decoded(self, segment_path):
+        # Lets ffmpeg decode the segment into the PCM format of the part
+        if self.process is None:
+            self.start(*DEFAULT_PCM_PARAMS)
+        channels, sample_width, frame_rate = self.params
+
+        decoder = subprocess.Popen([
+            self.ffmpeg, "-hide_banner", "-loglevel", "error",
+            "-i", segment_path, "-f", SAMPLE_FORMATS[sample_width],
+            "-ar", str(frame_rate), "-ac", str(channels), "pipe:1"
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        shutil.copyfileobj(decoder.stdout, self.process.stdin)
+        errors = decoder.stderr.read()
+        if decoder.wait() != 0:
+            raise RuntimeError(
+                f"ffmpeg could not decode {segment_path}: {errors.decode(errors='replace').strip()}")
+
+    def close(self):
+        if self.process is None:
+            return
+
+        process, self.process = self.process, None
+        process.stdin.close()
+        errors = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(
+                f"ffmpeg failed: {errors.decode(errors='replace').strip()}")
+
+
+def find_ffmpeg(config):
+    ffmpeg = shutil.which(config["FFMPEG_PATH"])
+    if ffmpeg is None:
+        raise RuntimeError(
+            f"{config['FFMPEG_PATH']} not found, install ffmpeg or set AUDIO_FORMAT=wav")
+
+    return ffmpeg
+
+
+def open_encoder(output_path, audio_format, config):
+    if audio_format == "wav":
+        return SegmentConcatenator(output_path)
+
+    return AudioEncoder(output_path, audio_format, config["AUDIO_BITRATE"], find_ffmpeg(config))
+
+
+def join_parts(part_paths, output_path, audio_format, config):
+    # Jobs submitted before formats were configurable have raw audio parts
+    if (audio_format or "wav") == "wav":
+        concatenator = SegmentConcatenator(output_path)
+        try:
+            for part_path in part_paths:
+                concatenator.append(part_path)
+        finally:
+            concatenator.close()
+        return
+
+    # Pages without text render to empty parts
+    part_paths = [part_path for part_path in part_paths
+                  if os.path.getsize(part_path) > 0]
+    if not part_paths:
+        open(output_path, "wb").close()
+        return
+
+    # Byte by byte, an Ogg file would be a chain of streams that many
+    # players stop after the first of. The concat demuxer copies the
+    # packets into a single stream without re-encoding, and gives MP3 one
+    # Xing header with the length of the whole file for seeking.
+    output_options = get_audio_format(audio_format)[2]
+    muxer = output_options[output_options.index("-f") + 1]
+    fd, list_path = tempfile.mkstemp(suffix=".txt")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as list_file:
+            for part_path in part_paths:
+                escaped = os.path.abspath(part_path).replace("'", "'\\''")
+                list_file.write(f"file '{escaped}'\n")
+
+        result = subprocess.run([
+            find_ffmpeg(config), "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-c", "copy", "-map_metadata", "-1", "-f", muxer, output_path
+        ], stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    finally:
+        os.remove(list_path)
@@ -0,0 +1,30 @@
+import mmap
+from contextlib import contextmanager
+from PyPDF2 import PdfReader
+
+
+@contextmanager
+def open_pdf(pdf_file_path):
+    # PdfReader reads a whole file into a BytesIO when given a path. A
+    # read-only memory map lets it parse the file in place, and OCR pool
+    # processes share the same page cache instead of each holding a copy.
+    with open(pdf_file_path, "rb") as pdf_file:
+        with mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as pdf_map:
+            yield PdfReader(pdf_map)
+
+
+def iter_pages(pdf_file_path, start=0, stop=None):
+    # Yields the texts of pages start to stop in order, one page at a time,
+    # so memory doesn't grow with the length of the document. Conversions
+    # run in parts of a few pages spread across the workers, which is where
+    # pages are processed in parallel.
+    with open_pdf(pdf_file_path) as reader:
+        stop = len(reader.pages) if stop is None else min(
+            stop, len(reader.pages))
+
+        for index in range(start, stop):
+            yield reader.pages[index].extract_text()
+
+
+def extract_pages(pdf_file_path):
+    return list(iter_pages(pdf_file_path))
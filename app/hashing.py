@@ -0,0 +1,74 @@
+import threading
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+from app.metrics import PASSWORD_HASH_QUEUE_DEPTH
+from app.pools import ProcessPool
+
+
+class HashingQueueFull(Exception):
+    pass
+
+
+class PasswordHasher:
+    # Password hashing is deliberately slow. Running it in a process pool
+    # keeps web worker threads free to serve other requests while a login
+    # storm keeps the spare cores busy. With workers=0 hashing runs inline.
+
+    def __init__(self, method="scrypt", workers=0, max_queue=64):
+        self.method = method
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.pool = ProcessPool()
+        # Hashes store their parameters before the first "$", e.g.
+        # "scrypt:32768:8:1" or "pbkdf2:sha256:600000"
+        self.method_prefix = generate_password_hash(
+            "", method=method).split("$")[0]
+
+    def get_executor(self):
+        return self.pool.get(self.workers)
+
+    def run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+
+        with self.lock:
+            if self.pending >= self.max_queue:
+                raise HashingQueueFull("Too many password hashes queued")
+            self.pending += 1
+        PASSWORD_HASH_QUEUE_DEPTH.inc()
+
+        try:
+            return self.get_executor().submit(fn, *args).result()
+        finally:
+            with self.lock:
+                self.pending -= 1
+            PASSWORD_HASH_QUEUE_DEPTH.dec()
+
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self.run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split("$")[0] != self.method_prefix
+
+    def queue_depth(self):
+        return self.pending
+
+
+def init_password_hasher(app):
+    password_hasher = PasswordHasher(
+        method=app.config["PASSWORD_HASH_METHOD"],
+        workers=app.config["PASSWORD_HASH_WORKERS"],
+        max_queue=app.config["PASSWORD_HASH_MAX_QUEUE"]
+    )
+    app.extensions["password_hasher"] = password_hasher
+
+    return password_hasher
+
+
+def get_password_hasher():
+    return current_app.extensions["password_hasher"]
@@ -0,0 +1,70 @@
+import logging
+import smtplib
+import threading
+import time
+from app import mail
+
+
+class MailConnectionPool:
+    # Keeps one SMTP connection open per worker thread, so a batch of emails
+    # or a stream of jobs pays for the TLS handshake and login once.
+    # Connections idle for longer than idle_timeout are replaced, and ones
+    # idle for longer than check_after are checked with NOOP before reuse,
+    # since the server may have dropped them in the meantime.
+
+    def __init__(self, idle_timeout=60, check_after=10):
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.local = threading.local()
+
+    def is_alive(self, connection):
+        if connection.host is None:
+            # MAIL_SUPPRESS_SEND, nothing to check
+            return True
+
+        try:
+            return connection.host.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def get(self):
+        connection = getattr(self.local, "connection", None)
+
+        if connection:
+            idle = time.monotonic() - self.local.last_used
+            if idle > self.idle_timeout or (idle > self.check_after and not self.is_alive(connection)):
+                self.close()
+                connection = None
+            elif idle > self.check_after:
+                # NOOP restarts the server's idle timer as well
+                self.local.last_used = time.monotonic()
+
+        if connection is None:
+            connection = mail.connect().__enter__()
+            self.local.connection = connection
+            self.local.last_used = time.monotonic()
+
+        return connection
+
+    def send(self, message):
+        try:
+            self.get().send(message)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped the pooled connection, retry once on a new one
+            self.close()
+            self.get().send(message)
+
+        self.local.last_used = time.monotonic()
+
+    def close(self):
+        connection = getattr(self.local, "connection", None)
+        self.local.connection = None
+
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except smtplib.SMTPException as e:
+                logging.warning(f"Closing SMTP connection failed: {e}")
+
+
+mail_connection_pool = MailConnectionPool()
@@ -0,0 +1,160 @@
+import time
+from flask import g, request
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+# The gauges below are set whenever they change rather than read when
+# /metrics is scraped. Callback gauges are left out of multiprocess mode,
+# set values are summed across the live processes.
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "soundable_password_hash_queue_depth",
+    "Password hashes waiting for or running in the hashing pool",
+    multiprocess_mode="livesum")
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "soundable_db_pool_checkout_seconds",
+    "Time spent waiting for a database connection from the pool",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30))
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "soundable_db_pool_checkout_timeouts",
+    "Connection checkouts that gave up after the pool timeout")
+DB_POOL_CHECKED_OUT = Gauge(
+    "soundable_db_pool_checked_out",
+    "Database connections currently checked out of the pool",
+    multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge(
+    "soundable_db_pool_overflow",
+    "Connections open beyond pool_size, negative while the pool fills up",
+    multiprocess_mode="livesum")
+
+
+BYTE_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024,
+                16 * 1024 * 1024, 64 * 1024 * 1024, 256 * 1024 * 1024)
+
+CONVERSION_INPUT_BYTES = Histogram(
+    "soundable_conversion_input_bytes",
+    "Size of the uploaded PDFs that were converted",
+    buckets=BYTE_BUCKETS)
+CONVERSION_OUTPUT_BYTES = Histogram(
+    "soundable_conversion_output_bytes",
+    "Size of the converted audio files",
+    buckets=BYTE_BUCKETS)
+CONVERSION_PAGES = Histogram(
+    "soundable_conversion_pages",
+    "Pages per converted PDF",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+CONVERSION_STAGE_SECONDS = Histogram(
+    "soundable_conversion_stage_seconds",
+    "Time spent in each conversion stage per page range",
+    ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900))
+CONVERSIONS_IN_PROGRESS = Gauge(
+    "soundable_conversions_in_progress",
+    "Conversion jobs currently running on this worker",
+    multiprocess_mode="livesum")
+CONVERSIONS_TOTAL = Counter(
+    "soundable_conversions_total",
+    "Finished conversion jobs by outcome",
+    ["status"])
+CONVERSIONS_REJECTED = Counter(
+    "soundable_conversions_rejected_total",
+    "Conversion submissions turned away before upload",
+    ["reason"])
+RESULT_CACHE_LOOKUPS = Counter(
+    "soundable_result_cache_lookups_total",
+    "Result cache lookups by outcome",
+    ["result"])
+
+REQUEST_LATENCY_SECONDS = Histogram(
+    "soundable_request_latency_seconds",
+    "Request latency per route",
+    ["blueprint", "endpoint", "method", "status"])
+
+
+def queue_depth(broker, queue_name):
+    # Messages waiting in a Dramatiq queue
+    if hasattr(broker, "do_qsize"):
+        return broker.do_qsize(queue_name)
+
+    return broker.queues[queue_name].qsize()
+
+
+class BrokerQueueCollector:
+    # Reads the queue depths from the broker when /metrics is scraped
+
+    def __init__(self):
+        self.broker = None
+
+    def collect(self):
+        family = GaugeMetricFamily(
+            "soundable_queue_depth", "Messages waiting in each Dramatiq queue",
+            labels=["queue"])
+
+        if self.broker is not None:
+            for queue_name in sorted(self.broker.get_declared_queues()):
+                try:
+                    family.add_metric(
+                        [queue_name], queue_depth(self.broker, queue_name))
+                except Exception:
+                    # Broker unavailable, leave the queue out of this scrape
+                    pass
+
+        yield family
+
+
+broker_queue_collector = BrokerQueueCollector()
+REGISTRY.register(broker_queue_collector)
+
+
+class InstrumentedQueuePool(QueuePool):
+    # Pool exhaustion shows up as time spent here rather than in queries
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+            self.record_usage()
+
+    def _do_return_conn(self, record):
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self.record_usage()
+
+    def record_usage(self):
+        DB_POOL_CHECKED_OUT.set(self.checkedout())
+        DB_POOL_OVERFLOW.set(self.overflow())
+
+
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+def record_request_latency(response):
+    if "request_start" in g:
+        REQUEST_LATENCY_SECONDS.labels(
+            blueprint=request.blueprint or "",
+            endpoint=request.endpoint or "unmatched",
+            method=request.method,
+            status=response.status_code
+        ).observe(time.perf_counter() - g.request_start)
+
+    return response
+
+
+def init_metrics(app, engine, broker):
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.record_usage()
+
+    broker_queue_collector.broker = broker
+
+    app.before_request(start_request_timer)
+    app.after_request(record_request_latency)
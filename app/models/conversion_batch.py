@@ -0,0 +1,43 @@
+from app import db
+from datetime import datetime
+import uuid
+
+
+class ConversionBatch(db.Model):
+    batch_id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey(
+        "user.user_id"), nullable=False)
+    created_on = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    jobs = db.relationship("ConversionJob", lazy="dynamic",
+                           order_by="ConversionJob.created_on")
+
+    def __init__(self, user_id, batch_id=None):
+        self.batch_id = batch_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.created_on = datetime.now()
+
+    def to_dict(self):
+        jobs = self.jobs.all()
+        statuses = {job.status for job in jobs}
+        if statuses <= {"finished"}:
+            status = "finished"
+        elif statuses & {"queued", "running"}:
+            status = "running"
+        else:
+            status = "failed"
+
+        # Finished jobs count in full, running ones by their finished parts
+        done = sum(1 if job.status == "finished" else
+                   job.segments_ready / job.segment_count if job.segment_count else 0
+                   for job in jobs)
+
+        return {
+            "batch_id": self.batch_id,
+            "status": status,
+            "created_on": self.created_on.isoformat(),
+            "progress": round(done / len(jobs), 3) if jobs else 1.0,
+            "job_count": len(jobs),
+            "jobs_finished": sum(job.status == "finished" for job in jobs),
+            "jobs_failed": sum(job.status == "failed" for job in jobs),
+            "jobs": [job.to_dict() for job in jobs]
+        }
@@ -0,0 +1,73 @@
+from app import db
+from datetime import datetime
+import uuid
+
+
+class ConversionJob(db.Model):
+    job_id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey(
+        "user.user_id"), nullable=False)
+    status = db.Column(db.String, nullable=False, default="queued")
+    pdf_file_path = db.Column(db.String, nullable=True)
+    storage_key = db.Column(db.String(64), nullable=True)
+    segment_count = db.Column(db.Integer, nullable=True)
+    segments_ready = db.Column(db.Integer, nullable=False, default=0)
+    error_message = db.Column(db.Text, nullable=True)
+    page_count = db.Column(db.Integer, nullable=True)
+    # "small" jobs go straight to the interactive queue, "large" ones wait
+    # here until the fair-share dispatcher sends them
+    size_class = db.Column(db.String(8), nullable=False, default="small")
+    dispatched_on = db.Column(db.TIMESTAMP(timezone=True), nullable=True)
+    audio_format = db.Column(db.String(8), nullable=True)
+    batch_id = db.Column(db.String(32), db.ForeignKey(
+        "conversion_batch.batch_id"), nullable=True, index=True)
+    file_name = db.Column(db.String(255), nullable=True)
+    pdf_size = db.Column(db.BigInteger, nullable=True)
+    audio_size = db.Column(db.BigInteger, nullable=True)
+    created_on = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    started_on = db.Column(db.TIMESTAMP(timezone=True), nullable=True)
+    finished_on = db.Column(db.TIMESTAMP(timezone=True), nullable=True)
+    # Set when the job finishes or fails, the sweeper deletes the row and
+    # whatever the job left behind after that
+    expires_on = db.Column(db.TIMESTAMP(timezone=True),
+                           nullable=True, index=True)
+
+    __table_args__ = (
+        # The dispatcher looks up waiting large jobs on every run
+        db.Index("ix_conversion_job_size_class_status", size_class, status),
+        # History pages walk a user's jobs newest first
+        db.Index("ix_conversion_job_user_id_created_on", user_id, created_on),
+    )
+
+    def __init__(self, user_id, pdf_file_path, storage_key=None, job_id=None, status="queued", page_count=None, size_class="small", audio_format=None, batch_id=None, file_name=None, pdf_size=None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.pdf_file_path = pdf_file_path
+        self.storage_key = storage_key
+        self.status = status
+        self.segments_ready = 0
+        self.page_count = page_count
+        self.size_class = size_class
+        self.audio_format = audio_format
+        self.batch_id = batch_id
+        self.file_name = file_name
+        self.pdf_size = pdf_size
+        self.created_on = datetime.now()
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "file_name": self.file_name,
+            "status": self.status,
+            "created_on": self.created_on.isoformat(),
+            "started_on": self.started_on.isoformat() if self.started_on else None,
+            "finished_on": self.finished_on.isoformat() if self.finished_on else None,
+            "expires_on": self.expires_on.isoformat() if self.expires_on else None,
+            "page_count": self.page_count,
+            "audio_format": self.audio_format,
+            "pdf_size": self.pdf_size,
+            "audio_size": self.audio_size,
+            "segment_count": self.segment_count,
+            "segments_ready": self.segments_ready,
+            "error_message": self.error_message
+        }
@@ -1,6 +1,13 @@
 from app import db
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy.orm import make_transient_to_detached
+
+# Columns kept in the user cache. The password hash is left out and loaded
+# from the database only when it is needed.
+CACHED_COLUMNS = ["user_id", "name", "email", "created_on", "is_confirmed",
+                  "confirmed_on", "verification_token", "token_expiration"]
+DATETIME_COLUMNS = {"created_on", "confirmed_on", "token_expiration"}
 
 
 class User(UserMixin, db.Model):
@@ -11,9 +18,16 @@ class User(UserMixin, db.Model):
     created_on = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
     is_confirmed = db.Column(db.Boolean, nullable=False, default=False)
     confirmed_on = db.Column(db.TIMESTAMP(timezone=True), nullable=True)
+    # The unique constraint also gives token lookups an index
     verification_token = db.Column(db.String, nullable=True, unique=True)
     token_expiration = db.Column(db.TIMESTAMP(timezone=True), nullable=True)
 
+    __table_args__ = (
+        # Emails are unique regardless of case, and lookups by lower(email)
+        # use this index
+        db.Index("ix_user_email_lower", db.func.lower(email), unique=True),
+    )
+
     def __init__(
             self, name, email, password, verification_token,  token_expiration, is_confirmed=False, confirmed_on=None
     ):
@@ -28,3 +42,31 @@ class User(UserMixin, db.Model):
 
     def get_id(self):
         return self.user_id
+
+    @classmethod
+    def find_by_email(cls, email):
+        return cls.query.filter(db.func.lower(cls.email) == email.lower()).first()
+
+    def to_cache(self):
+        row = {}
+        for column in CACHED_COLUMNS:
+            value = getattr(self, column)
+            if column in DATETIME_COLUMNS and value is not None:
+                value = value.isoformat()
+            row[column] = value
+
+        return row
+
+    @classmethod
+    def from_cache(cls, row):
+        user = cls.__mapper__.class_manager.new_instance()
+        for column in CACHED_COLUMNS:
+            value = row[column]
+            if column in DATETIME_COLUMNS and value is not None:
+                value = datetime.fromisoformat(value)
+            setattr(user, column, value)
+
+        # Attach the cached row to the session without querying the database
+        make_transient_to_detached(user)
+
+        return db.session.merge(user, load=False)
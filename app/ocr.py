@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from collections import deque
+from io import BytesIO
+from app.extraction import open_pdf
+from app.pools import ProcessPool
+
+WORD_CHARACTER = re.compile(r"\w")
+
+ocr_pool = ProcessPool()
+_available = None
+
+
+def needs_ocr(text, min_chars=20):
+    # Scanned pages have no text layer, or only a few stray characters
+    return len(WORD_CHARACTER.findall(text or "")) < min_chars
+
+
+def ocr_available():
+    # pytesseract, Pillow and the tesseract binary are optional. Without
+    # them scanned pages keep whatever text PyPDF2 found.
+    global _available
+
+    if _available is None:
+        try:
+            import pytesseract
+            import PIL
+
+            pytesseract.get_tesseract_version()
+            _available = True
+        except Exception as e:
+            logging.warning(f"OCR is not available: {e}")
+            _available = False
+
+    return _available
+
+
+def get_executor(workers):
+    return ocr_pool.get(workers)
+
+
+def cache_path(cache_dir, digest):
+    return os.path.join(cache_dir, digest[:2], f"{digest}.txt")
+
+
+def read_cached_text(cache_dir, digest):
+    path = cache_path(cache_dir, digest)
+    try:
+        with open(path, encoding="utf-8") as text_file:
+            text = text_file.read()
+    except FileNotFoundError:
+        return None
+
+    try:
+        # Pages in use stay in the cache, see prune_cache()
+        os.utime(path)
+    except OSError:
+        pass
+
+    return text
+
+
+def write_cached_text(cache_dir, digest, text):
+    destination = cache_path(cache_dir, digest)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+    # Same temp file and rename as the audio store, pool processes of
+    # several workers may write the same page at once
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(destination), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+            temp_file.write(text)
+        os.replace(temp_path, destination)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def prune_cache(cache_dir, max_age, now=None):
+    # Removes pages that haven't been recognized or read for max_age
+    # seconds and returns how many were removed
+    cutoff = (now or time.time()) - max_age
+    removed = 0
+
+    for directory, _, file_names in os.walk(cache_dir):
+        for file_name in file_names:
+            path = os.path.join(directory, file_name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                # Pruned by another worker sharing the cache
+                pass
+
+    return removed
+
+
+def ocr_page(pdf_file_path, page_index, language, cache_dir):
+    # Runs in a pool process. Results are cached by the page's images, so a
+    # page that shows up again, in a re-upload or with other voice settings,
+    # is only recognized once.
+    with open_pdf(pdf_file_path) as reader:
+        images = [image.data for image in reader.pages[page_index].images]
+
+    if not images:
+        return ""
+
+    sha256 = hashlib.sha256(language.encode("utf-8"))
+    for data in images:
+        sha256.update(data)
+    digest = sha256.hexdigest()
+
+    text = read_cached_text(cache_dir, digest)
+    if text is not None:
+        return text
+
+    import pytesseract
+    from PIL import Image
+
+    text = "\n".join(pytesseract.image_to_string(Image.open(BytesIO(data)), lang=language)
+                     for data in images)
+    write_cached_text(cache_dir, digest, text)
+
+    return text
+
+
+def recognize_pages(texts, pdf_file_path, config, start=0):
+    # Passes text pages through and sends pages without a usable text layer
+    # to the OCR pool. Texts are yielded in page order with a few pages in
+    # flight, so a mixed document only waits on the pages that need OCR.
+    if not config["OCR_ENABLED"] or not ocr_available():
+        yield from texts
+        return
+
+    workers = config["OCR_WORKERS"]
+    pending = deque()
+
+    def next_text():
+        text, future = pending.popleft()
+        if future is None:
+            return text
+
+        try:
+            return future.result() or text
+        except Exception as e:
+            logging.error(f"OCR of {pdf_file_path} failed: {e}")
+            return text
+
+    try:
+        for page_index, text in enumerate(texts, start):
+            future = None
+            if needs_ocr(text, config["OCR_MIN_CHARS"]):
+                future = get_executor(workers).submit(
+                    ocr_page, pdf_file_path, page_index,
+                    config["OCR_LANGUAGE"], config["OCR_CACHE_PATH"])
+            pending.append((text, future))
+
+            # Hand out text pages right away unless they are behind a page
+            # that is still being recognized
+            while pending and (pending[0][1] is None or len(pending) > workers * 2):
+                yield next_text()
+
+        while pending:
+            yield next_text()
+    finally:
+        for _, future in pending:
+            if future is not None:
+                future.cancel()
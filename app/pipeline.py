@@ -0,0 +1,77 @@
+import time
+from app.extraction import iter_pages
+from app.metrics import CONVERSION_STAGE_SECONDS
+from app.ocr import recognize_pages
+from app.synthesis import iter_chunks, synthesize_segments
+from app.text_filter import filter_pages
+
+
+class TimedStage:
+    # Wraps a generator stage and adds up the time spent producing its items.
+    # Stages are nested, so this includes the time of the stages upstream.
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.seconds = 0.0
+        self.items = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            item = next(self.iterator)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+        self.items += 1
+
+        return item
+
+    def close(self):
+        close = getattr(self.iterator, "close", None)
+        if close:
+            close()
+
+
+class ConversionPipeline:
+    # extract -> ocr -> filter -> chunk -> synthesize, as lazy generator stages. One
+    # page moves through the pipeline at a time and every stage only keeps a
+    # bounded buffer, so memory stays flat however long the document is.
+
+    def __init__(self, pdf_file_path, config, start=0, stop=None):
+        self.pages = TimedStage(iter_pages(
+            pdf_file_path, start=start, stop=stop))
+        self.recognized = TimedStage(recognize_pages(
+            self.pages, pdf_file_path, config, start))
+        self.texts = TimedStage(filter_pages(self.recognized))
+        self.chunks = TimedStage(iter_chunks(
+            self.texts, config["TTS_CHUNK_MAX_CHARS"]))
+        self.segments = TimedStage(synthesize_segments(
+            self.chunks, voice=config["TTS_VOICE"], rate=config["TTS_RATE"],
+            workers=config["TTS_WORKERS"]))
+
+    def __iter__(self):
+        return self.segments
+
+    def close(self):
+        self.segments.close()
+
+    def stage_seconds(self):
+        # Time spent in each stage on its own
+        return {
+            "extraction": self.pages.seconds,
+            "ocr": self.recognized.seconds - self.pages.seconds,
+            "filtering": self.texts.seconds - self.recognized.seconds,
+            "chunking": self.chunks.seconds - self.texts.seconds,
+            "synthesis": self.segments.seconds - self.chunks.seconds
+        }
+
+    def record_metrics(self):
+        for stage, seconds in self.stage_seconds().items():
+            CONVERSION_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+def convert_pages(pdf_file_path, config, start=0, stop=None):
+    return ConversionPipeline(pdf_file_path, config, start, stop)
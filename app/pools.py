@@ -0,0 +1,33 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+class ProcessPool:
+    # A process pool started on first use, so processes that never need it
+    # don't pay for it. The processes are spawned rather than forked, the
+    # parent runs threads and holds database and Redis connections.
+
+    def __init__(self, initializer=None):
+        self.initializer = initializer
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def get(self, workers):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self.initializer)
+
+        return self.executor
+
+
+def broker_redis_client(broker, enabled=True):
+    # Reuses the Redis connection pool of the Dramatiq broker. Other
+    # brokers, like the StubBroker in tests, have no Redis client.
+    if not enabled:
+        return None
+
+    return getattr(broker, "client", None)
@@ -0,0 +1,108 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from app.pools import broker_redis_client
+
+# Refills the bucket for the time since the last request and takes the
+# requested tokens if there are enough. Runs atomically in Redis, so all web
+# processes share one bucket per key. The clock is Redis' own, so skew
+# between web hosts doesn't matter.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * refill_rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+else
+    retry_after = (requested - tokens) / refill_rate
+end
+
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / refill_rate) + 1)
+
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RateLimiter:
+    # Token buckets keyed by e.g. user id or client IP. With a Redis client
+    # the buckets are shared by all processes. Without one, or while Redis is
+    # unavailable, each process keeps its own buckets in memory.
+
+    def __init__(self, redis_client=None, max_entries=10000):
+        self.redis_client = redis_client
+        self.max_entries = max_entries
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+        self.script = None
+        if redis_client is not None:
+            self.script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def redis_key(self, key):
+        return f"soundable:rate:{key}"
+
+    def acquire(self, key, capacity, refill_rate, tokens=1):
+        # Returns (allowed, retry_after) where retry_after is the number of
+        # seconds until enough tokens are available. refill_rate is in
+        # tokens per second.
+        if self.script is not None:
+            try:
+                allowed, retry_after = self.script(
+                    keys=[self.redis_key(key)], args=[capacity, refill_rate, tokens])
+                return bool(allowed), float(retry_after)
+            except Exception as e:
+                logging.warning(f"Rate limit check failed: {e}")
+
+        return self.acquire_local(key, capacity, refill_rate, tokens)
+
+    def acquire_local(self, key, capacity, refill_rate, tokens=1):
+        now = time.monotonic()
+
+        with self.lock:
+            available, updated = self.buckets.pop(key, (capacity, now))
+            available = min(capacity, available +
+                            (now - updated) * refill_rate)
+
+            allowed = available >= tokens
+            retry_after = 0
+            if allowed:
+                available -= tokens
+            else:
+                retry_after = (tokens - available) / refill_rate
+
+            self.buckets[key] = (available, now)
+            while len(self.buckets) > self.max_entries:
+                self.buckets.popitem(last=False)
+
+        return allowed, retry_after
+
+
+def retry_after_header(seconds):
+    # Retry-After only takes whole seconds
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+def init_rate_limiter(app, broker):
+    rate_limiter = RateLimiter(redis_client=broker_redis_client(
+        broker, app.config["RATE_LIMIT_REDIS"]))
+    app.extensions["rate_limiter"] = rate_limiter
+
+    return rate_limiter
+
+
+def get_rate_limiter():
+    return current_app.extensions["rate_limiter"]
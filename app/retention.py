@@ -0,0 +1,92 @@
+import logging
+import os
+from datetime import datetime, timedelta
+import dramatiq
+from app import db
+from app.models.conversion_batch import ConversionBatch
+from app.models.conversion_job import ConversionJob
+from app.storage import segment_key
+
+ENDED_STATUSES = ("finished", "failed")
+
+
+def expiry_time(config, now=None):
+    return (now or datetime.now()) + timedelta(seconds=config["JOB_RETENTION"])
+
+
+def remove_job_files(job, storage):
+    # Failed jobs keep their upload and finished parts for a retry, and the
+    # delayed segment cleanup of a finished job may never have run. The
+    # audio itself is shared with other jobs and expires with the result
+    # cache.
+    if job.pdf_file_path and os.path.exists(job.pdf_file_path):
+        os.remove(job.pdf_file_path)
+
+    # Segments are keyed by content, a job converting the same document
+    # right now checkpoints into the same keys
+    if is_storage_key_in_use(job):
+        return
+
+    for index in range(job.segment_count or 0):
+        storage.delete(segment_key(job.storage_key, index))
+
+
+def is_storage_key_in_use(job):
+    return db.session.query(ConversionJob.query.filter(
+        ConversionJob.storage_key == job.storage_key,
+        ConversionJob.job_id != job.job_id,
+        ConversionJob.status.notin_(ENDED_STATUSES)
+    ).exists()).scalar()
+
+
+def delete_expired_jobs(storage, batch_size, now=None):
+    # Deletes expired jobs batch_size rows per transaction, so a large
+    # backlog never holds locks for long, and returns how many were deleted
+    now = now or datetime.now()
+    deleted = 0
+
+    while True:
+        jobs = ConversionJob.query.filter(
+            ConversionJob.status.in_(ENDED_STATUSES),
+            ConversionJob.expires_on < now
+        ).order_by(ConversionJob.expires_on).limit(batch_size).all()
+
+        for job in jobs:
+            try:
+                remove_job_files(job, storage)
+            except OSError as e:
+                # Don't let one stuck file hold up the rest of the sweep
+                logging.warning(f"Could not remove files of job {job.job_id}: {e}")
+
+        if jobs:
+            ConversionJob.query.filter(
+                ConversionJob.job_id.in_([job.job_id for job in jobs])
+            ).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(jobs)
+
+        if len(jobs) < batch_size:
+            break
+
+    # Batches go once the last of their jobs is gone
+    ConversionBatch.query.filter(
+        ~ConversionBatch.jobs.any()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+    return deleted
+
+
+class JobSweeperMiddleware(dramatiq.Middleware):
+    # Starts the sweep when a Dramatiq worker process boots. The sweep
+    # reschedules itself, so it keeps running across restarts without cron.
+
+    def __init__(self, app):
+        self.app = app
+
+    def after_worker_boot(self, broker, worker):
+        if self.app.config["JOB_SWEEP_INTERVAL"] <= 0:
+            return
+
+        from app.tasks import sweep_expired_jobs
+        sweep_expired_jobs.send()
@@ -1,20 +1,43 @@
 from datetime import datetime, timedelta, timezone
 from flask_login import login_user, logout_user, login_required, current_user
-from app import db, login_manager, mail
-from flask import Blueprint, request, jsonify, session, url_for, send_file
+from app import db, login_manager
+from flask import Blueprint, request, jsonify, session, url_for, send_file, current_app, Response, stream_with_context
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
 from app.models.user import User
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy.exc import SQLAlchemyError
-from flask_mail import Message
+from app.models.conversion_job import ConversionJob
+from app.models.conversion_batch import ConversionBatch
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+import base64
+import hashlib
 import logging
+import os
 import secrets
-from io import BytesIO
+import shutil
+import tempfile
+import time
+import zipfile
+import zlib
 import pytz
-from app.tasks import convert_pdf_to_audio
+from app.tasks import convert_pdf_to_audio, dispatch_large_conversions, send_emails, send_job_message
+from app.extraction import open_pdf
+from app.encoding import can_stream_parts, get_audio_format
+from app.scheduler import size_class, waiting_large_jobs
+from PyPDF2.errors import PdfReadError
+from app.storage import audio_key, get_audio_storage, segment_key
+from app.cache import get_result_cache
+from app.user_cache import get_user_cache
+from app.hashing import HashingQueueFull, get_password_hasher
+from app.metrics import CONVERSIONS_REJECTED, broker_queue_collector, queue_depth
+from app.rate_limit import get_rate_limiter, retry_after_header
+from app.retention import expiry_time
 
 users_bp = Blueprint("users", __name__, url_prefix="/users")
 page_bp = Blueprint("p", __name__, url_prefix="")
 
+# Room for the multipart boundaries and form fields around the PDF
+MULTIPART_OVERHEAD = 64 * 1024
+
 # ----------------- HELPER FUNCTION -----------------------------#
 
 
@@ -70,10 +93,262 @@ def generate_verification_token():
 def send_token_email(user, endpoint, email_subject, email_body):
     verification_link = url_for(
         endpoint, token=user.verification_token, _external=True)
-    msg = Message(email_subject, recipients=[user.email])
-    msg.body = f"{email_body}: {
-        verification_link}"
-    mail.send(msg)
+    # Sent by a mail worker, so the request doesn't wait on SMTP
+    send_emails.send([{
+        "subject": email_subject,
+        "recipients": [user.email],
+        "body": f"{email_body}: {
+            verification_link}"
+    }])
+
+
+def save_upload(stream, upload_folder, max_size, chunk_size=64 * 1024):
+    # Werkzeug has already spooled large uploads to a temp file. Copy it to
+    # the upload folder in chunks, hashing on the way, without ever holding
+    # the whole document in memory.
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, upload_path = tempfile.mkstemp(dir=upload_folder, suffix=".pdf")
+
+    try:
+        with os.fdopen(fd, "wb") as upload:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                size += len(chunk)
+                if size > max_size:
+                    break
+                sha256.update(chunk)
+                upload.write(chunk)
+    except Exception:
+        # The client went away or the archive member is damaged
+        os.remove(upload_path)
+        raise
+
+    if size > max_size:
+        os.remove(upload_path)
+        return {"valid": False, "message": f"File size exceeds {max_size // (1024 * 1024)}MB limit"}
+
+    return {"valid": True, "upload_path": upload_path, "pdf_hash": sha256.hexdigest(), "size": size}
+
+
+# Encrypted members raise RuntimeError, unsupported compression methods
+# NotImplementedError, and damaged or truncated ones any of the others
+ARCHIVE_ERRORS = (zipfile.BadZipFile, zlib.error, RuntimeError,
+                  NotImplementedError, OSError, EOFError)
+
+
+class ArchiveMemberStream:
+    # Reports a member that can't be read as ValueError, like any other
+    # invalid file in the batch
+
+    def __init__(self, stream, description):
+        self.stream = stream
+        self.description = description
+
+    def read(self, size=-1):
+        try:
+            return self.stream.read(size)
+        except ARCHIVE_ERRORS as e:
+            raise ValueError(f"Could not read {self.description}: {e}")
+
+
+def iter_batch_files(uploads):
+    # Yields (file name, stream) for every PDF uploaded on its own or inside
+    # a ZIP archive
+    for upload in uploads:
+        if not upload.filename.lower().endswith(".zip"):
+            yield upload.filename, upload.stream
+            continue
+
+        try:
+            archive = zipfile.ZipFile(upload.stream)
+        except ARCHIVE_ERRORS as e:
+            raise ValueError(f"Could not read {upload.filename}: {e}")
+
+        with archive:
+            for member in archive.infolist():
+                file_name = os.path.basename(member.filename)
+                if member.is_dir() or file_name.startswith(".") or not file_name.lower().endswith(".pdf"):
+                    continue
+
+                description = f"{member.filename} in {upload.filename}"
+                try:
+                    stream = archive.open(member)
+                except ARCHIVE_ERRORS as e:
+                    raise ValueError(f"Could not read {description}: {e}")
+
+                with stream:
+                    yield file_name, ArchiveMemberStream(stream, description)
+
+
+def remove_uploads(upload_paths):
+    for upload_path in upload_paths:
+        if os.path.exists(upload_path):
+            os.remove(upload_path)
+
+
+def create_conversion_job(upload_result, user_id, file_name=None, batch_id=None):
+    # Adds a job for a saved upload to the session. Uploads that were
+    # converted before finish right away.
+    audio_format = current_app.config["AUDIO_FORMAT"]
+    storage_key = audio_key(upload_result["pdf_hash"],
+                            voice=current_app.config["TTS_VOICE"],
+                            rate=current_app.config["TTS_RATE"],
+                            audio_format=audio_format,
+                            bitrate=current_app.config["AUDIO_BITRATE"])
+
+    job = ConversionJob(user_id, None, storage_key=storage_key, audio_format=audio_format,
+                        batch_id=batch_id, file_name=file_name, pdf_size=upload_result["size"])
+
+    cache = get_result_cache()
+    if cache.get(storage_key):
+        # Same document and settings were converted before, skip
+        # extraction and synthesis and serve the stored file
+        os.remove(upload_result["upload_path"])
+        stat = cache.storage.stat(storage_key)
+        job.status = "finished"
+        job.started_on = job.finished_on = datetime.now()
+        job.expires_on = expiry_time(current_app.config, job.finished_on)
+        job.audio_size = stat[0] if stat else None
+    else:
+        try:
+            with open_pdf(upload_result["upload_path"]) as reader:
+                job.page_count = len(reader.pages)
+        except (PdfReadError, ValueError):
+            os.remove(upload_result["upload_path"])
+            return {"valid": False, "message": "Invalid PDF file"}
+
+        # Batches are bulk work, they always take the fair-share path so
+        # they can't crowd out interactive uploads
+        job.size_class = "large" if batch_id else size_class(
+            job.page_count, current_app.config)
+        job.pdf_file_path = upload_result["upload_path"]
+
+    db.session.add(job)
+
+    return {"valid": True, "job": job}
+
+
+def schedule_conversion(job):
+    if job.status == "finished":
+        return
+
+    if job.size_class == "small":
+        send_job_message(convert_pdf_to_audio, job.job_id)
+    else:
+        # Sent to the large queue when it's this user's turn
+        dispatch_large_conversions.send()
+
+
+def job_links(job):
+    links = {
+        "status_url": url_for("users.get_job_status", job_id=job.job_id),
+        "stream_url": url_for("users.stream_job_audio", job_id=job.job_id)
+    }
+    if job.status == "finished":
+        links["download_url"] = url_for(
+            "users.download_job_audio", job_id=job.job_id)
+
+    return links
+
+
+def check_queue_capacity(count=1):
+    config = current_app.config
+
+    # Global admission control: past a certain backlog new jobs would only
+    # wait longer, so turn them away and keep latency bounded for the rest
+    try:
+        waiting = queue_depth(convert_pdf_to_audio.broker,
+                              convert_pdf_to_audio.queue_name)
+    except Exception as e:
+        logging.warning(f"Queue depth check failed: {e}")
+        waiting = 0
+
+    # Large jobs wait in the database rather than in the broker, their
+    # uploads take up disk all the same
+    waiting += waiting_large_jobs()
+
+    if waiting + count > config["CONVERSION_MAX_QUEUE_DEPTH"]:
+        return {"valid": False, "reason": "queue_full", "status": 503,
+                "message": "Server is busy, please try again later",
+                "retry_after": config["CONVERSION_BUSY_RETRY_AFTER"]}
+
+    return {"valid": True}
+
+
+def admit_conversion(user_id, client_ip, count=1, prepaid=0):
+    # count is the number of documents submitted together, each one takes
+    # a place in the queue and a rate limit token. prepaid tokens were
+    # already taken by an earlier call for the same request.
+    config = current_app.config
+
+    capacity = check_queue_capacity(count)
+    if not capacity["valid"]:
+        return capacity
+
+    rate_limiter = get_rate_limiter()
+    limits = [
+        ("user", f"convert:user:{user_id}",
+         config["CONVERSION_USER_BURST"], config["CONVERSION_USER_PER_MINUTE"]),
+        ("ip", f"convert:ip:{client_ip}",
+         config["CONVERSION_IP_BURST"], config["CONVERSION_IP_PER_MINUTE"])
+    ]
+    for reason, key, burst, per_minute in limits:
+        if count > burst:
+            # Would never fit in the bucket, waiting doesn't help
+            return {"valid": False, "reason": f"batch_over_{reason}_limit", "status": 413,
+                    "message": f"At most {burst} documents can be submitted at once",
+                    "retry_after": None}
+
+        if count <= prepaid:
+            continue
+
+        allowed, retry_after = rate_limiter.acquire(
+            key, burst, per_minute / 60, count - prepaid)
+        if not allowed:
+            return {"valid": False, "reason": f"rate_limit_{reason}", "status": 429,
+                    "message": "Too many conversions, please try again later",
+                    "retry_after": retry_after}
+
+    return {"valid": True}
+
+
+def reject_conversion(admission):
+    CONVERSIONS_REJECTED.labels(reason=admission["reason"]).inc()
+    headers = {}
+    if admission["retry_after"] is not None:
+        headers = retry_after_header(admission["retry_after"])
+
+    # 429 Too Many Requests, 503 Service Unavailable or 413 Payload Too Large
+    return jsonify({"message": admission["message"]}), admission["status"], headers
+
+
+def validate_history_request(args, max_limit=100):
+    try:
+        limit = int(args.get("limit", 20))
+    except ValueError:
+        return {"valid": False, "message": "limit must be a number"}
+
+    if not 1 <= limit <= max_limit:
+        return {"valid": False, "message": f"limit must be between 1 and {max_limit}"}
+
+    cursor = None
+    if args.get("cursor"):
+        # The cursor is the (created_on, job_id) of the last job on the
+        # previous page
+        try:
+            created_on, job_id = base64.urlsafe_b64decode(
+                args["cursor"]).decode("utf-8").rsplit("_", 1)
+            cursor = (datetime.fromisoformat(created_on), job_id)
+        except ValueError:
+            return {"valid": False, "message": "Invalid cursor"}
+
+    return {"valid": True, "limit": limit, "cursor": cursor}
+
+
+def history_cursor(job):
+    # Encoded, so the "+" of a UTC offset survives the query string
+    cursor = f"{job.created_on.isoformat()}_{job.job_id}"
+    return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii")
 
 
 def convert_to_utc(user_tz):
@@ -87,7 +362,20 @@ def convert_to_utc(user_tz):
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.filter(User.user_id == int(user_id)).first()
+    user_cache = get_user_cache()
+
+    cached_row = user_cache.get(int(user_id))
+    if cached_row:
+        return User.from_cache(cached_row)
+
+    # Taken before the read, so a row read before a password change can't
+    # be cached after it
+    generation = user_cache.generation(int(user_id))
+    db_user = User.query.filter(User.user_id == int(user_id)).first()
+    if db_user:
+        user_cache.set(db_user.user_id, db_user.to_cache(), generation)
+
+    return db_user
 
 # ----------------- LOGIN -----------------------------#
 
@@ -105,11 +393,16 @@ def user_login():
         user_email = request_data.get("email")
         user_password = request_data.get("password")
 
-        db_user = User.query.filter_by(email=user_email).first()
+        db_user = User.find_by_email(user_email)
 
         if db_user:
             session["logged_in_user_email"] = db_user.email
-            if check_password_hash(db_user.password, user_password):
+            password_hasher = get_password_hasher()
+            if password_hasher.verify(db_user.password, user_password):
+                if password_hasher.needs_rehash(db_user.password):
+                    # Upgrade hashes made with older parameters
+                    db_user.password = password_hasher.hash(user_password)
+                    db.session.commit()
                 login_user(db_user)  # initialize a user session
                 return jsonify({
                     "message": "success",
@@ -118,6 +411,9 @@ def user_login():
 
         # 401 Unauthorized
         return jsonify({"message": "Your email or password is incorrect"}), 401
+    except HashingQueueFull:
+        # 503 Service Unavailable: every hashing worker is busy
+        return jsonify({"message": "Server is busy, please try again"}), 503, {"Retry-After": "1"}
     except SQLAlchemyError as e:
         # Handle database errors
         db.session.rollback()
@@ -136,6 +432,20 @@ def user_login():
 def unauthorized_access(error):
     return jsonify({"message": "Unauthorized access. Please log in."}), 401
 
+# ----------------- METRICS -----------------------------#
+
+
+@page_bp.route("/metrics", methods=["GET"])
+def metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Several gunicorn workers write to the same directory, aggregate them
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(broker_queue_collector)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
 # ----------------- LOGOUT -----------------------------#
 
 
@@ -158,18 +468,12 @@ def user_signup():
             return jsonify({"message": validation_result["message"]}), 400
 
         data = validation_result["data"]
-        db_user = User.query.filter_by(email=data["email"]).first()
-
-        if db_user:
-            # 409 Conflict
-            return jsonify({"message": f"{data['email']} already existed"}), 409
-
         token, expiration_time = generate_verification_token()
 
         new_user = User(
             name=data["name"],
             email=data["email"],
-            password=generate_password_hash(data["password"]),
+            password=get_password_hasher().hash(data["password"]),
             verification_token=token,
             token_expiration=expiration_time
         )
@@ -182,6 +486,15 @@ def user_signup():
 
         # 201 Created: successfully create a new resource
         return jsonify({"message": "Successfully created an account"}), 201
+    except IntegrityError:
+        # The unique index on lower(email) rejects duplicates, even when two
+        # signups for the same email race each other
+        db.session.rollback()
+        # 409 Conflict
+        return jsonify({"message": f"{data['email']} already existed"}), 409
+    except HashingQueueFull:
+        # 503 Service Unavailable: every hashing worker is busy
+        return jsonify({"message": "Server is busy, please try again"}), 503, {"Retry-After": "1"}
     except SQLAlchemyError as e:
         db.session.rollback()  # Rollback the session to prevent partial changes
         logging.error(f"Database error occurred: {e}")
@@ -221,6 +534,7 @@ def verify_email(token):
     db_user.token_expiration = None
 
     db.session.commit()
+    get_user_cache().invalidate(db_user.user_id)
 
     return jsonify({
         "action": "login",
@@ -240,6 +554,7 @@ def resend_verification_email():
     current_user.token_expiration = expiration_time
 
     db.session.commit()
+    get_user_cache().invalidate(current_user.user_id)
 
     send_token_email(current_user, "p.verify_email", "Verify Your Email",
                      "Please click the following link to verify your email")
@@ -254,10 +569,11 @@ def forgot_password():
     user_email = session.get("logged_in_user_email")
 
     if user_email:
-        db_user = User.query.filter_by(email=user_email).first()
+        db_user = User.find_by_email(user_email)
         if db_user:
             db_user.verification_token, db_user.token_expiration = generate_verification_token()
             db.session.commit()
+            get_user_cache().invalidate(db_user.user_id)
 
             send_token_email(db_user, "p.change_password", "Change Your Password",
                              "Please click the following link to change your password")
@@ -293,18 +609,22 @@ def change_password(token):
         if not validation_result["valid"]:
             return jsonify({"message": validation_result["message"]}), 400
 
-        db_user.password = generate_password_hash(
+        db_user.password = get_password_hasher().hash(
             request_data["password"])
         db_user.verification_token = None
         db_user.token_expiration = None
 
         db.session.commit()
+        get_user_cache().invalidate(db_user.user_id)
 
         return jsonify({
             "action": "change password",
             "message": "Successfully changed password"
         }), 200
 
+    except HashingQueueFull:
+        # 503 Service Unavailable: every hashing worker is busy
+        return jsonify({"message": "Server is busy, please try again"}), 503, {"Retry-After": "1"}
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({"message": "Database error occurred"}), 500
@@ -317,6 +637,18 @@ def change_password(token):
 @users_bp.route("/convert-pdf-to-audio", methods=["POST"])
 @login_required
 def convert_pdf():
+    # Checked before the upload is read so rejected requests stay cheap
+    admission = admit_conversion(current_user.user_id, request.remote_addr)
+    if not admission["valid"]:
+        return reject_conversion(admission)
+
+    max_size = current_app.config["MAX_PDF_SIZE"]
+
+    # Reject oversized uploads from the header before reading the body
+    if request.content_length and request.content_length > max_size + MULTIPART_OVERHEAD:
+        # 413 Payload Too Large
+        return jsonify({"message": f"File size exceeds {max_size // (1024 * 1024)}MB limit"}), 413
+
     if "file" not in request.files:
         return jsonify({"message": "No file part"})
 
@@ -328,16 +660,376 @@ def convert_pdf():
         return jsonify({"message": "Not a PDF file"}), 400
 
     try:
-        # Read PDF file into memory
-        bytes_file = BytesIO(pdf_file.read())
+        upload_result = save_upload(
+            pdf_file.stream, current_app.config["UPLOAD_FOLDER"], max_size)
+        if not upload_result["valid"]:
+            return jsonify({"message": upload_result["message"]}), 413
+
+        job_result = create_conversion_job(
+            upload_result, current_user.user_id, file_name=pdf_file.filename[:255])
+        if not job_result["valid"]:
+            return jsonify({"message": job_result["message"]}), 400
 
-        # Check if the file size exceeds 2MB
-        if len(bytes_file.getvalue()) > (2 * 1024 * 1024):
-            return jsonify({"message": "File size exceeds 2MB limit"}), 400
+        job = job_result["job"]
+        db.session.commit()
+        schedule_conversion(job)
 
-        response = convert_pdf_to_audio(bytes_file)
+        job_data = {
+            "message": "Conversion job submitted",
+            "job_id": job.job_id,
+            "status": job.status,
+            **job_links(job)
+        }
 
-        return send_file(response, as_attachment=True)
+        # 202 Accepted: the conversion runs on a Dramatiq worker
+        return jsonify(job_data), 202
 
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logging.error(f"Database error occurred: {e}")
+        return jsonify({"message": "Database error occurred"}), 500
     except Exception as e:
         return jsonify({"message": f"Error processing PDF file: {e}"}), 500
+
+
+@users_bp.route("/jobs", methods=["GET"])
+@login_required
+def list_jobs():
+    history_request = validate_history_request(request.args)
+    if not history_request["valid"]:
+        return jsonify({"message": history_request["message"]}), 400
+
+    limit = history_request["limit"]
+    query = ConversionJob.query.filter(
+        ConversionJob.user_id == current_user.user_id)
+
+    # Keyset pagination: pages start right after the previous one in the
+    # (user_id, created_on) index, however deep the history goes
+    if history_request["cursor"]:
+        query = query.filter(tuple_(ConversionJob.created_on, ConversionJob.job_id)
+                             < tuple_(*history_request["cursor"]))
+
+    # One extra row tells whether there is another page
+    jobs = query.order_by(ConversionJob.created_on.desc(), ConversionJob.job_id.desc()
+                          ).limit(limit + 1).all()
+
+    return jsonify({
+        "jobs": [{**job.to_dict(), **job_links(job)} for job in jobs[:limit]],
+        "next_cursor": history_cursor(jobs[limit - 1]) if len(jobs) > limit else None
+    }), 200
+
+
+@users_bp.route("/jobs/<job_id>", methods=["GET"])
+@login_required
+def get_job_status(job_id):
+    job = ConversionJob.query.filter_by(
+        job_id=job_id, user_id=current_user.user_id).first()
+
+    if not job:
+        return jsonify({"message": "Job not found"}), 404
+
+    job_data = job.to_dict()
+    if job.status == "finished":
+        job_data["download_url"] = url_for(
+            "users.download_job_audio", job_id=job.job_id)
+
+    return jsonify(job_data), 200
+
+
+@users_bp.route("/jobs/<job_id>/download", methods=["GET"])
+@login_required
+def download_job_audio(job_id):
+    job = ConversionJob.query.filter_by(
+        job_id=job_id, user_id=current_user.user_id).first()
+
+    if not job:
+        return jsonify({"message": "Job not found"}), 404
+
+    if job.status != "finished":
+        # 409 Conflict: the audio file is not ready yet
+        return jsonify({"message": f"Job is {job.status}"}), 409
+
+    storage = get_audio_storage()
+
+    if not job.storage_key or not storage.exists(job.storage_key):
+        # 410 Gone: the audio file has already been cleaned up
+        return jsonify({"message": "Audio file is no longer available"}), 410
+
+    # Downloads count as use, so popular files stay in the cache
+    storage.touch(job.storage_key)
+    extension, mimetype, _ = get_audio_format(job.audio_format)
+    download_name = f"{job.job_id}.{extension}"
+    local_path = storage.local_path(job.storage_key)
+    accel_prefix = current_app.config["AUDIO_ACCEL_REDIRECT_PREFIX"]
+
+    if local_path and accel_prefix:
+        # nginx serves the file from an internal location, including range
+        # requests. Same validators as below, whichever way it is deployed.
+        response = Response(mimetype=mimetype)
+        set_audio_cache_headers(response, job.storage_key)
+        if request.if_none_match.contains(job.storage_key):
+            # Answered here, without the redirect nginx would send the file
+            response.status_code = 304
+            return response
+
+        response.headers["X-Accel-Redirect"] = accel_prefix + os.path.relpath(
+            local_path, current_app.config["AUDIO_STORAGE_PATH"])
+        response.headers["Content-Disposition"] = f"attachment; filename={download_name}"
+        return response
+
+    # Flask answers Range requests with 206 and If-None-Match with 304, and
+    # hands the file to the web server when USE_X_SENDFILE is set
+    response = send_file(local_path or storage.open(job.storage_key), as_attachment=True,
+                         download_name=download_name, mimetype=mimetype,
+                         conditional=True, etag=job.storage_key,
+                         max_age=current_app.config["AUDIO_DOWNLOAD_MAX_AGE"])
+    set_audio_cache_headers(response, job.storage_key)
+    if local_path:
+        # Werkzeug only advertises range support on range responses
+        response.accept_ranges = "bytes"
+
+    return response
+
+
+def set_audio_cache_headers(response, storage_key):
+    # Stored files never change, the storage key is a hash of the document
+    # and the settings, so it makes a strong ETag
+    response.set_etag(storage_key)
+    response.cache_control.max_age = current_app.config["AUDIO_DOWNLOAD_MAX_AGE"]
+    # Only the owner may download it, so shared caches must not keep a copy
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+
+
+def read_audio_file(storage, key, chunk_size=64 * 1024):
+    with storage.open(key) as audio_file:
+        yield from iter(lambda: audio_file.read(chunk_size), b"")
+
+
+def stream_segments(job_id, storage_key, stream_parts=True):
+    # Without stream_parts only the finished file is sent
+    storage = get_audio_storage()
+    poll_interval = current_app.config["STREAM_POLL_INTERVAL"]
+    index = 0
+
+    while True:
+        job = db.session.get(ConversionJob, job_id, populate_existing=True)
+        if job is None:
+            # Deleted while streaming, e.g. by the retention sweep
+            return
+
+        segments_ready, status = job.segments_ready, job.status
+        # Give the connection back to the pool, the stream may wait on the
+        # worker or a slow client for minutes
+        db.session.remove()
+
+        while stream_parts and index < segments_ready and storage.exists(segment_key(storage_key, index)):
+            yield from read_audio_file(storage, segment_key(storage_key, index))
+            index += 1
+
+        if status == "failed":
+            return
+
+        if status == "finished":
+            if index == 0 and storage.exists(storage_key):
+                # Served from the cache, or the segments are already gone
+                yield from read_audio_file(storage, storage_key)
+            return
+
+        # Wait for the worker to publish the next segment
+        time.sleep(poll_interval)
+
+
+@users_bp.route("/jobs/<job_id>/stream", methods=["GET"])
+@login_required
+def stream_job_audio(job_id):
+    job = ConversionJob.query.filter_by(
+        job_id=job_id, user_id=current_user.user_id).first()
+
+    if not job:
+        return jsonify({"message": "Job not found"}), 404
+
+    if job.status == "failed":
+        return jsonify({"message": "Job failed"}), 409
+
+    # No Content-Length, so the response is sent with chunked transfer
+    # encoding as segments become available
+    return Response(stream_with_context(stream_segments(job.job_id, job.storage_key,
+                                                        can_stream_parts(job.audio_format))),
+                    mimetype=get_audio_format(job.audio_format)[1])
+
+# ----------------- BATCH CONVERSION -----------------------------#
+
+
+@users_bp.route("/convert-batch", methods=["POST"])
+@login_required
+def convert_batch():
+    # The files are only known once the upload is read, but a full queue or
+    # an empty bucket turns the batch away before that. The first document
+    # is paid for here and the rest once the batch is deduplicated.
+    admission = admit_conversion(current_user.user_id, request.remote_addr)
+    if not admission["valid"]:
+        return reject_conversion(admission)
+
+    max_size = current_app.config["MAX_PDF_SIZE"]
+    max_files = current_app.config["BATCH_MAX_FILES"]
+    max_batch_size = current_app.config["BATCH_MAX_SIZE"]
+
+    if request.content_length and request.content_length > max_batch_size + MULTIPART_OVERHEAD:
+        # 413 Payload Too Large
+        return jsonify({"message": f"Batch size exceeds {max_batch_size // (1024 * 1024)}MB limit"}), 413
+
+    uploads = [upload for upload in request.files.getlist("files")
+               if upload.filename != ""]
+    if not uploads:
+        return jsonify({"message": "No selected file"}), 400
+
+    batch = ConversionBatch(current_user.user_id)
+    files = []
+    jobs_by_hash = {}
+    upload_paths = []
+    total_size = 0
+
+    try:
+        for file_name, stream in iter_batch_files(uploads):
+            if not file_name.lower().endswith(".pdf"):
+                files.append({"file_name": file_name,
+                             "message": "Not a PDF file"})
+                continue
+
+            if len(jobs_by_hash) >= max_files:
+                raise ValueError(
+                    f"Batch has more than {max_files} PDF files")
+
+            upload_result = save_upload(
+                stream, current_app.config["UPLOAD_FOLDER"], min(max_size, max_batch_size - total_size))
+            if not upload_result["valid"]:
+                # Also stops ZIP archives that unpack to far more than
+                # they weigh
+                raise ValueError(upload_result["message"])
+
+            total_size += upload_result["size"]
+            duplicate = jobs_by_hash.get(upload_result["pdf_hash"])
+            if duplicate:
+                # Converted once, every copy links to the same job
+                os.remove(upload_result["upload_path"])
+                files.append({"file_name": file_name, "job_id": duplicate.job_id,
+                              "duplicate_of": duplicate.file_name})
+                continue
+
+            upload_paths.append(upload_result["upload_path"])
+            job_result = create_conversion_job(
+                upload_result, current_user.user_id, file_name=file_name[:255], batch_id=batch.batch_id)
+            if not job_result["valid"]:
+                files.append({"file_name": file_name,
+                             "message": job_result["message"]})
+                continue
+
+            job = job_result["job"]
+            jobs_by_hash[upload_result["pdf_hash"]] = job
+            files.append({"file_name": file_name, "job_id": job.job_id,
+                          "status": job.status, **job_links(job)})
+
+        if not jobs_by_hash:
+            raise ValueError("No valid PDF files in batch")
+
+        # Every distinct document counts as a conversion of its own
+        admission = admit_conversion(
+            current_user.user_id, request.remote_addr, len(jobs_by_hash), prepaid=1)
+        if not admission["valid"]:
+            db.session.rollback()
+            remove_uploads(upload_paths)
+            return reject_conversion(admission)
+
+        db.session.add(batch)
+        db.session.commit()
+
+    except Exception as e:
+        # No job row points at these uploads, the sweep would never find them
+        db.session.rollback()
+        remove_uploads(upload_paths)
+
+        if isinstance(e, ValueError):
+            return jsonify({"message": str(e)}), 400
+        if isinstance(e, SQLAlchemyError):
+            logging.error(f"Database error occurred: {e}")
+            return jsonify({"message": "Database error occurred"}), 500
+        logging.error(f"Batch conversion failed: {e}")
+        return jsonify({"message": f"Error processing batch: {e}"}), 500
+
+    if any(job.status != "finished" for job in jobs_by_hash.values()):
+        # The dispatcher sends the batch jobs in turn with other users' work
+        dispatch_large_conversions.send()
+
+    # 202 Accepted: the conversions run on Dramatiq workers
+    return jsonify({
+        "message": "Batch submitted",
+        "batch_id": batch.batch_id,
+        "status_url": url_for("users.get_batch_status", batch_id=batch.batch_id),
+        "download_url": url_for("users.download_batch_audio", batch_id=batch.batch_id),
+        "files": files
+    }), 202
+
+
+@users_bp.route("/batches/<batch_id>", methods=["GET"])
+@login_required
+def get_batch_status(batch_id):
+    batch = ConversionBatch.query.filter_by(
+        batch_id=batch_id, user_id=current_user.user_id).first()
+
+    if not batch:
+        return jsonify({"message": "Batch not found"}), 404
+
+    batch_data = batch.to_dict()
+    for job_data in batch_data["jobs"]:
+        if job_data["status"] == "finished":
+            job_data["download_url"] = url_for(
+                "users.download_job_audio", job_id=job_data["job_id"])
+
+    return jsonify(batch_data), 200
+
+
+def archive_name(file_name, extension, used_names):
+    stem = os.path.splitext(file_name or "audio")[0]
+    name = f"{stem}.{extension}"
+    counter = 1
+    while name in used_names:
+        counter += 1
+        name = f"{stem} ({counter}).{extension}"
+    used_names.add(name)
+
+    return name
+
+
+@users_bp.route("/batches/<batch_id>/download", methods=["GET"])
+@login_required
+def download_batch_audio(batch_id):
+    batch = ConversionBatch.query.filter_by(
+        batch_id=batch_id, user_id=current_user.user_id).first()
+
+    if not batch:
+        return jsonify({"message": "Batch not found"}), 404
+
+    storage = get_audio_storage()
+    jobs = [job for job in batch.jobs.filter_by(status="finished")
+            if storage.exists(job.storage_key)]
+    if not jobs:
+        # 409 Conflict: nothing to download yet
+        return jsonify({"message": "No finished audio in batch"}), 409
+
+    # Built in a temp file, the audio is already compressed so it's stored
+    # rather than deflated. Jobs that aren't finished yet are left out.
+    archive_file = tempfile.TemporaryFile()
+    used_names = set()
+    with zipfile.ZipFile(archive_file, "w", zipfile.ZIP_STORED) as archive:
+        for job in jobs:
+            extension = get_audio_format(job.audio_format)[0]
+            with storage.open(job.storage_key) as audio_file, archive.open(
+                    archive_name(job.file_name, extension, used_names), "w", force_zip64=True) as entry:
+                shutil.copyfileobj(audio_file, entry)
+            storage.touch(job.storage_key)
+    archive_file.seek(0)
+
+    return send_file(archive_file, as_attachment=True,
+                     download_name=f"{batch.batch_id}.zip", mimetype="application/zip")
@@ -0,0 +1,85 @@
+from datetime import datetime
+from sqlalchemy import case, func
+from app import db
+from app.models.conversion_job import ConversionJob
+
+IN_FLIGHT_STATUSES = ("queued", "running")
+
+
+def size_class(page_count, config):
+    if page_count > config["CONVERSION_SMALL_MAX_PAGES"]:
+        return "large"
+
+    return "small"
+
+
+def large_jobs_in_flight():
+    return ConversionJob.query.filter(
+        ConversionJob.size_class == "large",
+        ConversionJob.dispatched_on.isnot(None),
+        ConversionJob.status.in_(IN_FLIGHT_STATUSES)
+    ).count()
+
+
+def waiting_large_jobs():
+    return ConversionJob.query.filter_by(
+        size_class="large", status="queued").count()
+
+
+def next_large_job():
+    # Round-robin across users: the user with the fewest large jobs in
+    # flight goes first, ties go to whoever was served least recently. One
+    # user's hundred uploads then take turns with everyone else's.
+    waiting_users = db.session.query(ConversionJob.user_id).filter(
+        ConversionJob.size_class == "large",
+        ConversionJob.status == "queued",
+        ConversionJob.dispatched_on.is_(None)
+    ).distinct()
+
+    in_flight = func.sum(case(
+        (ConversionJob.dispatched_on.isnot(None)
+         & ConversionJob.status.in_(IN_FLIGHT_STATUSES), 1),
+        else_=0))
+    user_stats = db.session.query(
+        ConversionJob.user_id, in_flight, func.max(ConversionJob.dispatched_on)
+    ).filter(
+        ConversionJob.size_class == "large",
+        ConversionJob.user_id.in_(waiting_users)
+    ).group_by(ConversionJob.user_id).all()
+
+    if not user_stats:
+        return None
+
+    user_id, _, _ = min(user_stats, key=lambda stats: (
+        stats[1], stats[2] is not None, stats[2], stats[0]))
+
+    return ConversionJob.query.filter_by(
+        user_id=user_id, size_class="large", status="queued", dispatched_on=None
+    ).order_by(ConversionJob.created_on).first()
+
+
+def claim_job(job):
+    # Several dispatchers can run at once, only one of them gets the job
+    claimed = ConversionJob.query.filter_by(
+        job_id=job.job_id, dispatched_on=None
+    ).update({"dispatched_on": datetime.now()}, synchronize_session=False)
+    db.session.commit()
+
+    return claimed == 1
+
+
+def dispatch_large_jobs(max_in_flight, send):
+    # Sends waiting large jobs until max_in_flight of them are queued or
+    # running, and returns the ids of the jobs it sent
+    dispatched = []
+
+    while large_jobs_in_flight() < max_in_flight:
+        job = next_large_job()
+        if job is None:
+            break
+
+        if claim_job(job):
+            send(job.job_id)
+            dispatched.append(job.job_id)
+
+    return dispatched
@@ -0,0 +1,214 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from flask import current_app
+
+
+def document_hash(file_obj, chunk_size=64 * 1024):
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: file_obj.read(chunk_size), b""):
+        sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def audio_key(pdf_hash, voice=None, rate=None, audio_format=None, bitrate=None):
+    # The same document spoken or encoded with different settings is a
+    # different file
+    settings = f"{pdf_hash}:{voice or ''}:{rate or ''}"
+    if audio_format:
+        settings += f":{audio_format}:{bitrate or ''}"
+
+    return hashlib.sha256(settings.encode("utf-8")).hexdigest()
+
+
+def segment_key(key, index):
+    # Page-range parts of a conversion in progress, see app/tasks.py
+    return f"{key}.{index:05d}"
+
+
+class AudioStorage:
+    def exists(self, key):
+        raise NotImplementedError
+
+    def save_file(self, key, file_path):
+        raise NotImplementedError
+
+    def open(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def stat(self, key):
+        # Returns (size, created, last_access) or None if the key is missing
+        raise NotImplementedError
+
+    def entries(self):
+        # Yields (key, size, created, last_access) for every stored file
+        raise NotImplementedError
+
+    def touch(self, key):
+        pass
+
+    def local_path(self, key):
+        # Backends that cannot hand out a filesystem path return None
+        return None
+
+
+class LocalAudioStorage(AudioStorage):
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        # Fan out into sub directories so no directory grows too large
+        return os.path.join(self.root, key[:2], f"{key}.mp3")
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def save_file(self, key, file_path):
+        destination = self.path(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        # Write to a temp file next to the destination and rename it, so
+        # readers never see a partially written file
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(destination), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file, open(file_path, "rb") as source:
+                shutil.copyfileobj(source, temp_file)
+            os.replace(temp_path, destination)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return destination
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    def delete(self, key):
+        if self.exists(key):
+            os.remove(self.path(key))
+
+    def stat(self, key):
+        try:
+            stat = os.stat(self.path(key))
+        except FileNotFoundError:
+            return None
+
+        # mtime is set once when the file is stored, atime tracks usage
+        return stat.st_size, stat.st_mtime, stat.st_atime
+
+    def entries(self):
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                if not file_name.endswith(".mp3"):
+                    continue
+                key = file_name[:-len(".mp3")]
+                if "." in key:
+                    # Segments are not cached results on their own
+                    continue
+                stat = self.stat(key)
+                if stat:
+                    yield (key, *stat)
+
+    def touch(self, key):
+        stat = self.stat(key)
+        if stat:
+            # Set atime explicitly, filesystems are often mounted noatime
+            os.utime(self.path(key), (time.time(), stat[1]))
+
+    def local_path(self, key):
+        return self.path(key)
+
+
+class S3AudioStorage(AudioStorage):
+    def __init__(self, bucket, prefix="", endpoint_url=None):
+        # boto3 is only needed when the S3 backend is configured
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def object_name(self, key):
+        return f"{self.prefix}{key}.mp3"
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(
+                Bucket=self.bucket, Key=self.object_name(key))
+            return True
+        except ClientError:
+            return False
+
+    def save_file(self, key, file_path):
+        # S3 only makes an object visible once the upload is complete
+        self.client.upload_file(file_path, self.bucket, self.object_name(key))
+
+        return self.object_name(key)
+
+    def open(self, key):
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self.object_name(key))
+
+        return response["Body"]
+
+    def delete(self, key):
+        self.client.delete_object(
+            Bucket=self.bucket, Key=self.object_name(key))
+
+    def stat(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            response = self.client.head_object(
+                Bucket=self.bucket, Key=self.object_name(key))
+        except ClientError:
+            return None
+
+        # S3 does not track reads, so LRU falls back to upload time
+        modified = response["LastModified"].timestamp()
+
+        return response["ContentLength"], modified, modified
+
+    def entries(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                key = item["Key"][len(self.prefix):-len(".mp3")]
+                if "." in key:
+                    continue
+                modified = item["LastModified"].timestamp()
+                yield key, item["Size"], modified, modified
+
+
+def init_audio_storage(app):
+    backend = app.config["AUDIO_STORAGE_BACKEND"]
+
+    if backend == "local":
+        storage = LocalAudioStorage(app.config["AUDIO_STORAGE_PATH"])
+    elif backend == "s3":
+        storage = S3AudioStorage(
+            app.config["AUDIO_STORAGE_S3_BUCKET"],
+            prefix=app.config["AUDIO_STORAGE_S3_PREFIX"],
+            endpoint_url=app.config["AUDIO_STORAGE_S3_ENDPOINT_URL"]
+        )
+    else:
+        raise ValueError(f"Unknown audio storage backend: {backend}")
+
+    app.extensions["audio_storage"] = storage
+
+    return storage
+
+
+def get_audio_storage():
+    return current_app.extensions["audio_storage"]
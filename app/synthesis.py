@@ -0,0 +1,238 @@
+import os
+import re
+import shutil
+import tempfile
+import threading
+import wave
+from collections import deque
+from itertools import islice
+import dramatiq
+import pyttsx3
+from app.pools import ProcessPool
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_text(text, max_chars=2000):
+    # Pack whole paragraphs into chunks, falling back to sentences and then
+    # to hard cuts when a paragraph or sentence is longer than max_chars
+    chunks = []
+    current = ""
+
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        sentences = SENTENCE_END.split(paragraph) if len(
+            paragraph) > max_chars else [paragraph]
+
+        for sentence in sentences:
+            for start in range(0, len(sentence), max_chars):
+                piece = sentence[start:start + max_chars]
+
+                if current and len(current) + len(piece) + 1 > max_chars:
+                    chunks.append(current)
+                    current = piece
+                else:
+                    current = f"{current} {piece}" if current else piece
+
+    if current:
+        chunks.append(current)
+
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def iter_chunks(texts, max_chars=2000):
+    # Chunks a stream of page texts. Only the unfinished tail of the text is
+    # buffered between pages.
+    buffer = ""
+    chunked = False
+
+    for text in texts:
+        buffer += text
+        if len(buffer) > max_chars:
+            chunks = split_text(buffer, max_chars)
+            # The last chunk may continue on the next page
+            for chunk in chunks[:-1]:
+                chunked = True
+                yield chunk
+            buffer = chunks[-1] if chunks else ""
+
+    for chunk in split_text(buffer, max_chars):
+        chunked = True
+        yield chunk
+
+    if not chunked:
+        # A document without text still produces a (silent) audio file
+        yield ""
+
+
+class TTSEngineManager:
+    # Keeps one warm engine per process. Loading the speech driver and its
+    # voices is the expensive part of pyttsx3.init(), so it is done once and
+    # the engine is reused across jobs until it breaks.
+
+    def __init__(self, factory=None):
+        self.factory = factory
+        self.engine = None
+        # pyttsx3 engines are not thread safe, worker threads take turns
+        self.lock = threading.RLock()
+        self.created = 0
+
+    def is_healthy(self):
+        if self.engine is None:
+            return False
+
+        try:
+            return self.engine.getProperty("rate") is not None
+        except Exception:
+            return False
+
+    def get(self):
+        with self.lock:
+            if not self.is_healthy():
+                self.reset()
+                self.engine = (self.factory or pyttsx3.init)()
+                self.created += 1
+
+            return self.engine
+
+    def reset(self):
+        with self.lock:
+            if self.engine is not None:
+                try:
+                    self.engine.stop()
+                except Exception:
+                    pass
+            self.engine = None
+
+    def render(self, chunk, voice=None, rate=None):
+        with self.lock:
+            tts_engine = self.get()
+            try:
+                return render_chunk(chunk, voice, rate, tts_engine)
+            except Exception:
+                # Drop the broken engine, the next chunk gets a fresh one
+                self.reset()
+                raise
+
+
+engine_manager = TTSEngineManager()
+
+
+class TTSEngineMiddleware(dramatiq.Middleware):
+    # Warms the engines when a Dramatiq worker process boots, so the first
+    # job doesn't pay for driver startup
+
+    def __init__(self, app):
+        self.app = app
+
+    def after_worker_boot(self, broker, worker):
+        engine_manager.get()
+
+        workers = self.app.config["TTS_WORKERS"]
+        if workers > 1:
+            executor = get_executor(workers)
+            for future in [executor.submit(warm_up) for _ in range(workers)]:
+                future.result()
+
+
+def warm_up():
+    engine_manager.get()
+
+
+# Every pool process starts its engine when it boots
+tts_pool = ProcessPool(initializer=warm_up)
+
+
+def render_pooled(chunk, voice=None, rate=None):
+    # Runs in a pool process with that process's own engine
+    return engine_manager.render(chunk, voice, rate)
+
+
+def render_chunk(chunk, voice, rate, tts_engine):
+    if voice:
+        tts_engine.setProperty("voice", voice)
+    if rate:
+        tts_engine.setProperty("rate", int(rate))
+
+    fd, segment_path = tempfile.mkstemp(suffix=".mp3")
+    os.close(fd)
+    tts_engine.save_to_file(chunk, segment_path)
+    tts_engine.runAndWait()
+
+    return segment_path
+
+
+def get_executor(workers):
+    return tts_pool.get(workers)
+
+
+def synthesize_segments(chunks, voice=None, rate=None, workers=1):
+    # Yields one temp audio file per chunk, in document order, as soon as it
+    # is rendered. The caller owns the files and must remove them.
+    if workers <= 1:
+        for chunk in chunks:
+            yield engine_manager.render(chunk, voice, rate)
+        return
+
+    executor = get_executor(workers)
+    remaining_chunks = iter(chunks)
+    # Keep every engine busy without queueing the whole document at once
+    pending = deque(executor.submit(render_pooled, chunk, voice, rate)
+                    for chunk in islice(remaining_chunks, workers * 2))
+
+    try:
+        while pending:
+            segment_path = pending.popleft().result()
+            for chunk in islice(remaining_chunks, 1):
+                pending.append(executor.submit(
+                    render_pooled, chunk, voice, rate))
+            yield segment_path
+    finally:
+        # The consumer stopped early, clean up segments nobody will read
+        for future in pending:
+            if not future.cancel() and not future.exception():
+                remove_segment(future.result())
+
+
+def remove_segment(segment_path):
+    if os.path.exists(segment_path):
+        os.remove(segment_path)
+
+
+class SegmentConcatenator:
+    # Appends segments to the final audio file one at a time, so segments
+    # can be removed as soon as they are appended
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.output = None
+        self.is_wav = False
+
+    def append(self, segment_path):
+        if os.path.getsize(segment_path) == 0:
+            # A range of pages without any text renders to an empty part
+            return
+
+        if self.output is None:
+            with open(segment_path, "rb") as first_segment:
+                self.is_wav = first_segment.read(4) == b"RIFF"
+
+        if self.is_wav:
+            # Some drivers write WAV regardless of the file name, which can't
+            # simply be appended byte by byte
+            with wave.open(segment_path, "rb") as segment:
+                if self.output is None:
+                    self.output = wave.open(self.output_path, "wb")
+                    self.output.setparams(segment.getparams())
+                self.output.writeframes(
+                    segment.readframes(segment.getnframes()))
+        else:
+            if self.output is None:
+                self.output = open(self.output_path, "wb")
+            with open(segment_path, "rb") as segment:
+                shutil.copyfileobj(segment, self.output)
+
+    def close(self):
+        if self.output is not None:
+            self.output.close()
+            self.output = None
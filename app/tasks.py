@@ -1,15 +1,24 @@
 import os
-import re
-import dramatiq
-from io import BytesIO
-import threading
-import pyttsx3
-from PyPDF2 import PdfReader
-
-
-def remove_pdf_content(pdf_content):
-    if pdf_content:
-        pdf_content = None
+import logging
+import shutil
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+import tempfile
+from flask import current_app
+from flask_mail import Message
+from app import db, dramatiq
+from app.models.conversion_job import ConversionJob
+from app.cache import get_result_cache
+from app.encoding import join_parts, open_encoder
+from app.extraction import open_pdf
+from app.mailer import mail_connection_pool
+from app.metrics import CONVERSION_INPUT_BYTES, CONVERSION_OUTPUT_BYTES, CONVERSION_PAGES, CONVERSIONS_IN_PROGRESS, CONVERSIONS_TOTAL
+from app.ocr import prune_cache
+from app.pipeline import convert_pages
+from app.rate_limit import get_rate_limiter
+from app.retention import delete_expired_jobs, expiry_time
+from app.scheduler import dispatch_large_jobs
+from app.storage import get_audio_storage, segment_key
 
 
 def remove_audio_file(audio_file_path):
@@ -18,42 +27,329 @@ def remove_audio_file(audio_file_path):
         audio_file_path = None
 
 
-def filter_text(text):
-    # Remove chapter headings
-    text = re.sub(r'Chapter \d+: [^\n]+\n?', '', text)
-    # Remove dates in MM/DD/YY format
-    text = re.sub(r'\d{2}/\d{2}/\d{2}', '', text)
-    # Remove times in HH:MM AM/PM format
-    text = re.sub(r'\d{1,2}:\d{2} [AP]M', '', text)
-    # Remove page numbers in "Page x" format
-    text = re.sub(r'Page \d+', '', text)
+@contextmanager
+def fetch_audio_file(storage, key):
+    # Yields a local path for a stored file, downloading it if the backend
+    # has no filesystem path for it
+    local_path = storage.local_path(key)
+    if local_path:
+        yield local_path
+        return
+
+    fd, audio_file_path = tempfile.mkstemp(suffix=".mp3")
+    try:
+        with os.fdopen(fd, "wb") as audio_file, storage.open(key) as stored_file:
+            shutil.copyfileobj(stored_file, audio_file)
+        yield audio_file_path
+    finally:
+        remove_audio_file(audio_file_path)
+
+
+def plan_parts(job):
+    # Splits the document into page ranges. Every part is rendered into its
+    # own segment in the audio store, which doubles as its checkpoint.
+    if job.page_count is None:
+        with open_pdf(job.pdf_file_path) as reader:
+            job.page_count = len(reader.pages)
+
+    part_pages = current_app.config["CONVERSION_PART_PAGES"]
+    parts = [(part, start, min(start + part_pages, job.page_count))
+             for part, start in enumerate(range(0, job.page_count, part_pages))]
+
+    job.segment_count = len(parts)
+    db.session.commit()
+
+    return parts
+
+
+def convert_part(job, part, start, stop):
+    # A part that is already in the store was finished by an earlier attempt
+    storage = get_audio_storage()
+    key = segment_key(job.storage_key, part)
+    if storage.exists(key):
+        return
+
+    pipeline = convert_pages(job.pdf_file_path, current_app.config, start, stop)
+    fd, part_path = tempfile.mkstemp(suffix=".mp3")
+    os.close(fd)
+    # Segments are encoded while the rest of the part is still rendering.
+    # Jobs submitted before formats were configurable keep the raw audio.
+    concatenator = open_encoder(
+        part_path, job.audio_format or "wav", current_app.config)
+
+    try:
+        try:
+            for segment_path in pipeline:
+                try:
+                    concatenator.append(segment_path)
+                finally:
+                    remove_audio_file(segment_path)
+        finally:
+            pipeline.close()
+            concatenator.close()
+
+        # Stored in one piece, so a crash never leaves half a part behind
+        storage.save_file(key, part_path)
+    finally:
+        remove_audio_file(part_path)
+
+    pipeline.record_metrics()
+
+
+def publish_progress(job):
+    # Parts can finish out of order. Clients stream the leading run of
+    # finished parts, so only that run counts as ready.
+    storage = get_audio_storage()
+    db.session.refresh(job)
+    ready = job.segments_ready
+    while ready < job.segment_count and storage.exists(segment_key(job.storage_key, ready)):
+        ready += 1
+
+    ConversionJob.query.filter(
+        ConversionJob.job_id == job.job_id,
+        ConversionJob.segments_ready < ready
+    ).update({"segments_ready": ready}, synchronize_session=False)
+    db.session.commit()
+    db.session.refresh(job)
+
+
+def assemble_audio(job):
+    # Stitches the parts together into the cached result. Running it again
+    # after a crash or a duplicate message does no harm.
+    cache = get_result_cache()
+    if cache.storage.exists(job.storage_key):
+        return
 
-    return text
+    storage = get_audio_storage()
+    fd, audio_file_path = tempfile.mkstemp(suffix=".mp3")
+    os.close(fd)
+
+    try:
+        with ExitStack() as part_files:
+            part_paths = [part_files.enter_context(fetch_audio_file(storage, segment_key(job.storage_key, part)))
+                          for part in range(job.segment_count)]
+            join_parts(part_paths, audio_file_path,
+                       job.audio_format, current_app.config)
+
+        CONVERSION_INPUT_BYTES.observe(os.path.getsize(job.pdf_file_path))
+        CONVERSION_PAGES.observe(job.page_count)
+        CONVERSION_OUTPUT_BYTES.observe(os.path.getsize(audio_file_path))
+        cache.put(job.storage_key, audio_file_path)
+    finally:
+        remove_audio_file(audio_file_path)
+
+
+def start_job(job):
+    job.status = "running"
+    # Timed from the first attempt, retries don't reset it
+    job.started_on = job.started_on or datetime.now()
+    job.expires_on = None
+    db.session.commit()
+
+
+def finish_job(job):
+    CONVERSIONS_TOTAL.labels(status="finished").inc()
+
+    if job.segment_count:
+        # Keep the segments around for a while for clients still streaming
+        remove_audio_segments.send_with_options(
+            args=(job.storage_key, job.segment_count),
+            delay=current_app.config["SEGMENT_RETENTION"] * 1000)
+
+    if job.pdf_file_path and os.path.exists(job.pdf_file_path):
+        os.remove(job.pdf_file_path)
+
+    stat = get_audio_storage().stat(job.storage_key)
+    job.status = "finished"
+    job.finished_on = datetime.now()
+    job.expires_on = expiry_time(current_app.config, job.finished_on)
+    job.audio_size = stat[0] if stat else None
+    job.pdf_file_path = None
+    job.error_message = None
+    db.session.commit()
+
+
+def fail_job(job, error_message):
+    # Leave the upload and the finished parts in place so a retry can
+    # pick them up again
+    CONVERSIONS_TOTAL.labels(status="failed").inc()
+    job.status = "failed"
+    job.finished_on = datetime.now()
+    job.expires_on = expiry_time(current_app.config, job.finished_on)
+    job.error_message = error_message
+    db.session.commit()
+
+
+@dramatiq.actor(queue_name="mail", max_retries=5, min_backoff=1000, max_backoff=5 * 60 * 1000)
+def send_emails(emails):
+    # emails is a batch of {"subject", "recipients", "body"} dicts, sent over
+    # the worker thread's pooled SMTP connection
+    for index, email in enumerate(emails):
+        msg = Message(email["subject"], recipients=email["recipients"])
+        msg.body = email["body"]
+
+        try:
+            mail_connection_pool.send(msg)
+        except Exception as e:
+            logging.error(f"Sending email to {email['recipients']} failed: {e}")
+            mail_connection_pool.close()
+            if index == 0:
+                # Nothing was sent yet, let Dramatiq retry with backoff
+                raise
+            # Retry only the emails that were not sent
+            send_emails.send(emails[index:])
+            return
 
 
 @dramatiq.actor
-def convert_pdf_to_audio(pdf):
-    bytes_file = BytesIO(pdf.read())
-    reader = PdfReader(bytes_file)
-    pdf_content = ""
-
-    for page in reader.pages:
-        pdf_content += page.extract_text()
-
-    filtered_text = filter_text(pdf_content)
-
-    # Convert text to audio
-    tts_engine = pyttsx3.init()
-    audio_file_path = os.path.join(os.getcwd(), "tts.mp3")
-    tts_engine.save_to_file(filtered_text, audio_file_path)
-    tts_engine.runAndWait()
-
-    # Set timers to remove PDF content and audio file after 2 minutes
-    pdf_timer = threading.Timer(
-        120, remove_pdf_content, args=[pdf_content])
-    audio_timer = threading.Timer(
-        120, remove_audio_file, args=[audio_file_path])
-    pdf_timer.start()
-    audio_timer.start()
-
-    return audio_file_path
+def remove_audio_segments(storage_key, segment_count):
+    storage = get_audio_storage()
+
+    for index in range(segment_count):
+        storage.delete(segment_key(storage_key, index))
+
+
+@dramatiq.actor(queue_name="conversions", max_retries=3)
+def convert_pdf_to_audio(job_id):
+    # Small documents: all parts are rendered in this message. A retry
+    # resumes after the last finished part, and the message that runs out of
+    # retries fails the job, see fail_conversion.
+    job = db.session.get(ConversionJob, job_id)
+
+    if not job:
+        logging.error(f"Conversion job {job_id} not found")
+        return
+
+    start_job(job)
+
+    with CONVERSIONS_IN_PROGRESS.track_inprogress():
+        # Another job may already have converted the same document
+        if not get_result_cache().storage.exists(job.storage_key):
+            for part, start, stop in plan_parts(job):
+                convert_part(job, part, start, stop)
+                publish_progress(job)
+            assemble_audio(job)
+
+    finish_job(job)
+
+
+# Large documents are held in the database and handed to the large queue a
+# few at a time, see app/scheduler.py. Each one is fanned out into part
+# messages that any large worker can pick up, and the last part to finish
+# sends the assembly. A message that runs out of retries fails the job.
+@dramatiq.actor(queue_name="conversions-large", max_retries=3)
+def convert_large_pdf_to_audio(job_id):
+    job = db.session.get(ConversionJob, job_id)
+
+    if not job:
+        logging.error(f"Conversion job {job_id} not found")
+        return
+
+    start_job(job)
+
+    if get_result_cache().storage.exists(job.storage_key):
+        finish_job(job)
+        dispatch_large_conversions.send()
+        return
+
+    storage = get_audio_storage()
+    missing_parts = [(part, start, stop) for part, start, stop in plan_parts(job)
+                     if not storage.exists(segment_key(job.storage_key, part))]
+
+    if not missing_parts:
+        send_job_message(assemble_conversion, job_id)
+
+    for part, start, stop in missing_parts:
+        send_job_message(convert_pdf_part, job_id, part, start, stop)
+
+
+@dramatiq.actor(queue_name="conversions-large", max_retries=3)
+def convert_pdf_part(job_id, part, start, stop):
+    job = db.session.get(ConversionJob, job_id)
+
+    if not job or job.status != "running":
+        # Another part already failed the job
+        return
+
+    with CONVERSIONS_IN_PROGRESS.track_inprogress():
+        convert_part(job, part, start, stop)
+
+    publish_progress(job)
+    if job.segments_ready == job.segment_count:
+        send_job_message(assemble_conversion, job_id)
+
+
+@dramatiq.actor(queue_name="conversions-large", max_retries=3)
+def assemble_conversion(job_id):
+    job = db.session.get(ConversionJob, job_id)
+
+    if not job or job.status != "running":
+        return
+
+    assemble_audio(job)
+    finish_job(job)
+
+    # The slot is free now, hand it to the next user in line
+    dispatch_large_conversions.send()
+
+
+@dramatiq.actor(queue_name="conversions")
+def fail_conversion(message_data, exception_data):
+    # on_failure callbacks run after every failed attempt, only the one
+    # that used up the retries fails the job
+    actor = dramatiq.broker.get_actor(message_data["actor_name"])
+    if message_data["options"].get("retries", 0) <= actor.options["max_retries"]:
+        return
+
+    job = db.session.get(ConversionJob, message_data["args"][0])
+
+    if job and job.status != "failed":
+        logging.error(
+            f"Conversion job {job.job_id} failed: {exception_data['message']}")
+        fail_job(job, exception_data["message"])
+
+    if not job or job.size_class == "large":
+        dispatch_large_conversions.send()
+
+
+def send_job_message(actor, job_id, *args):
+    actor.send_with_options(args=(job_id, *args),
+                            on_failure=fail_conversion.actor_name)
+
+
+@dramatiq.actor(queue_name="conversions")
+def dispatch_large_conversions():
+    dispatch_large_jobs(current_app.config["CONVERSION_LARGE_MAX_IN_FLIGHT"],
+                        lambda job_id: send_job_message(convert_large_pdf_to_audio, job_id))
+
+
+@dramatiq.actor(max_retries=0)
+def sweep_expired_jobs():
+    config = current_app.config
+    interval = config["JOB_SWEEP_INTERVAL"]
+    if interval <= 0:
+        return
+
+    # Every worker that boots starts a sweep and every sweep schedules the
+    # next one. Only one sweep per interval gets the token, the others end
+    # their chain, so a single chain is left however often workers restart.
+    allowed, _ = get_rate_limiter().acquire(
+        "sweep:jobs", 1, 1 / (interval * 0.9))
+    if not allowed:
+        return
+
+    try:
+        deleted = delete_expired_jobs(
+            get_audio_storage(), config["JOB_SWEEP_BATCH_SIZE"])
+        if deleted:
+            logging.info(f"Deleted {deleted} expired conversion jobs")
+
+        # Expired audio is otherwise only evicted once the cache is full, and
+        # this corrects the size total of audio stored by other processes
+        get_result_cache().evict()
+
+        pruned = prune_cache(config["OCR_CACHE_PATH"], config["OCR_CACHE_TTL"])
+        if pruned:
+            logging.info(f"Removed {pruned} unused OCR cache pages")
+    finally:
+        sweep_expired_jobs.send_with_options(delay=interval * 1000)
@@ -0,0 +1,128 @@
+import re
+from collections import Counter, deque
+
+LIGATURES = {
+    "ﬀ": "ff",
+    "ﬁ": "fi",
+    "ﬂ": "fl",
+    "ﬃ": "ffi",
+    "ﬄ": "ffl",
+    "ﬅ": "ft",
+    "ﬆ": "st"
+}
+
+# Pages on either side of a page that are checked for its running header and
+# footer. A top or bottom line is dropped when more than half of the pages in
+# the window start or end with it.
+RUNNING_LINE_WINDOW = 5
+RUNNING_LINE_MIN_PAGES = 3
+
+# (name, pattern, replacement). Patterns must only use non-capturing groups,
+# the combined pattern wraps each one in a named group. The replacement is a
+# string or a function that takes the match.
+DEFAULT_RULES = [
+    # Chapter headings
+    ("chapter_heading", r"Chapter \d+: [^\n]+\n?", ""),
+    # Dates in MM/DD/YY format
+    ("date", r"\d{2}/\d{2}/\d{2}", ""),
+    # Times in HH:MM AM/PM format
+    ("time", r"\d{1,2}:\d{2} [AP]M", ""),
+    # Page numbers in "Page x" or "Page x of y" format
+    ("page_number", r"Page \d+(?: of \d+)?", ""),
+    # Footers that are only a page number on their own line
+    ("page_number_footer", r"^[ \t]*\d+[ \t]*$\n?", ""),
+    # Words hyphenated across a line break
+    ("hyphenation", r"(?<=\w)-\n(?=\w)", ""),
+    # Ligatures some PDFs keep as single characters
+    ("ligature", "[" + "".join(LIGATURES) + "]",
+     lambda match: LIGATURES[match.group()])
+]
+
+
+class TextFilter:
+    def __init__(self, rules=None):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.compile()
+
+    def add_rule(self, name, pattern, replacement=""):
+        self.rules.append((name, pattern, replacement))
+        self.compile()
+
+    def compile(self):
+        # All rules go into one alternation, so the text is scanned once no
+        # matter how many rules there are
+        self.pattern = re.compile(
+            "|".join(f"(?P<{name}>{pattern})" for name, pattern, _ in self.rules),
+            re.MULTILINE)
+        self.replacements = {
+            name: replacement for name, _, replacement in self.rules}
+
+    def replace(self, match):
+        replacement = self.replacements[match.lastgroup]
+
+        return replacement(match) if callable(replacement) else replacement
+
+    def apply(self, text):
+        return self.pattern.sub(self.replace, text)
+
+
+default_filter = TextFilter()
+
+
+def filter_text(text):
+    return default_filter.apply(text)
+
+
+def normalize_line(line):
+    # Page numbers in a running header change from page to page
+    return re.sub(r"\d+", "#", " ".join(line.split())).lower()
+
+
+def edge_lines(page):
+    lines = [line for line in page.splitlines() if line.strip()]
+    if not lines:
+        return None, None
+
+    return normalize_line(lines[0]), normalize_line(lines[-1])
+
+
+def strip_page(page, edges, window):
+    if len(window) < RUNNING_LINE_MIN_PAGES or edges[0] is None:
+        return page
+
+    needed = len(window) // 2 + 1
+    headers = Counter(top for top, _ in window)
+    footers = Counter(bottom for _, bottom in window)
+
+    lines = page.split("\n")
+    filled = [index for index, line in enumerate(lines) if line.strip()]
+    drop = set()
+    if headers[edges[0]] >= needed:
+        drop.add(filled[0])
+    if footers[edges[1]] >= needed:
+        drop.add(filled[-1])
+
+    return "\n".join(
+        line for index, line in enumerate(lines) if index not in drop)
+
+
+def strip_running_lines(pages, window_size=RUNNING_LINE_WINDOW):
+    # Looks window_size // 2 pages ahead, so a page is only held back until
+    # the pages after it have been read
+    window = deque(maxlen=window_size)
+    pending = deque()
+
+    for page in pages:
+        edges = edge_lines(page)
+        window.append(edges)
+        pending.append((page, edges))
+        if len(pending) > window_size // 2:
+            yield strip_page(*pending.popleft(), window)
+
+    while pending:
+        yield strip_page(*pending.popleft(), window)
+
+
+def filter_pages(pages):
+    for page in strip_running_lines(pages):
+        yield default_filter.apply(page)
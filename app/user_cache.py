@@ -0,0 +1,129 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from app.pools import broker_redis_client
+
+
+class UserCache:
+    # Caches the user row that Flask-Login loads on every authenticated
+    # request. The in-process tier is a small TTL/LRU map, the optional Redis
+    # tier is shared by all processes. Other processes can serve a stale row
+    # from their local tier for up to local_ttl seconds after a change.
+    #
+    # A row read from the database before an invalidation must not be cached
+    # after it. Callers take generation() before the read and pass it to
+    # set(), which drops the row if the user was invalidated in between.
+
+    def __init__(self, max_entries=1024, local_ttl=30, redis_client=None, redis_ttl=300):
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.redis_client = redis_client
+        self.redis_ttl = redis_ttl
+        self.entries = OrderedDict()
+        # Bumped by every invalidation in this process
+        self.local_generation = 0
+        self.lock = threading.Lock()
+
+    def redis_key(self, user_id):
+        return f"soundable:user:{user_id}"
+
+    def generation_key(self, user_id):
+        # Bumped by every invalidation of the user. Kept without a TTL, it
+        # is one small counter per user.
+        return f"soundable:user:{user_id}:generation"
+
+    def generation(self, user_id):
+        redis_generation = None
+        if self.redis_client is not None:
+            try:
+                redis_generation = int(self.redis_client.get(
+                    self.generation_key(user_id)) or 0)
+            except Exception as e:
+                logging.warning(f"User cache lookup failed: {e}")
+
+        with self.lock:
+            return self.local_generation, redis_generation
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(user_id)
+                return entry[1]
+            self.entries.pop(user_id, None)
+
+        if self.redis_client is None:
+            return None
+
+        try:
+            cached_entry, redis_generation = self.redis_client.mget(
+                self.redis_key(user_id), self.generation_key(user_id))
+        except Exception as e:
+            # Redis being down shouldn't log everyone out
+            logging.warning(f"User cache lookup failed: {e}")
+            return None
+
+        if cached_entry is None:
+            return None
+
+        entry = json.loads(cached_entry)
+        if entry.get("generation") != int(redis_generation or 0):
+            # Written by a load that started before an invalidation
+            return None
+
+        with self.lock:
+            local_generation = self.local_generation
+        self.set_local(user_id, entry["row"], local_generation)
+
+        return entry["row"]
+
+    def set(self, user_id, row, generation=None):
+        local_generation, redis_generation = generation or self.generation(user_id)
+        self.set_local(user_id, row, local_generation)
+
+        if self.redis_client is not None and redis_generation is not None:
+            try:
+                self.redis_client.set(self.redis_key(user_id), json.dumps(
+                    {"generation": redis_generation, "row": row}), ex=self.redis_ttl)
+            except Exception as e:
+                logging.warning(f"User cache update failed: {e}")
+
+    def set_local(self, user_id, row, local_generation):
+        with self.lock:
+            if local_generation != self.local_generation:
+                return
+            self.entries[user_id] = (time.monotonic() + self.local_ttl, row)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.local_generation += 1
+            self.entries.pop(user_id, None)
+
+        if self.redis_client is not None:
+            try:
+                self.redis_client.incr(self.generation_key(user_id))
+                self.redis_client.delete(self.redis_key(user_id))
+            except Exception as e:
+                logging.warning(f"User cache invalidation failed: {e}")
+
+
+def init_user_cache(app, broker):
+    user_cache = UserCache(
+        max_entries=app.config["USER_CACHE_MAX_ENTRIES"],
+        local_ttl=app.config["USER_CACHE_TTL"],
+        redis_client=broker_redis_client(broker, app.config["USER_CACHE_REDIS"]),
+        redis_ttl=app.config["USER_CACHE_REDIS_TTL"]
+    )
+    app.extensions["user_cache"] = user_cache
+
+    return user_cache
+
+
+def get_user_cache():
+    return current_app.extensions["user_cache"]
@@ -0,0 +1,224 @@
+# Benchmarks extraction, filtering, chunking and synthesis on synthetic PDFs
+# and records throughput, p50/p99 latency and peak RSS as JSON.
+#
+#   python -m benchmarks.bench_pipeline --output baseline.json
+#   python -m benchmarks.bench_pipeline --compare baseline.json
+#
+# Synthesis uses a stub TTS driver, so the numbers measure our pipeline and
+# not the speech engine. Every case runs in a fresh process so its peak RSS
+# isn't inflated by the cases before it.
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import wave
+from PyPDF2 import PageObject, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+STAGES = ["extraction", "filtering", "chunking", "synthesis"]
+DEFAULT_PAGES = [1, 10, 100, 1000]
+
+PAGE_LINES = [
+    "Chapter 3: Scaling the Web Tier",
+    "Page {page} of {pages}",
+    "Updated 05/27/24 at 3:15 PM",
+    "Scalability is the ability to adjust the capacity of the system to",
+    "cost-efficiently fulfill the demands. Scalability usually means an",
+    "ability to handle more users, clients, data, transactions or re-",
+    "quests without affecting the user experience. It is important to",
+    "remember that scalability should not be treated as a single scalar,",
+    "but rather a multi-dimensional measure of the system."
+]
+
+
+def generate_pdf(path, pages):
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica")
+    })
+    resources = DictionaryObject({
+        NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+    })
+
+    for page_number in range(1, pages + 1):
+        page = PageObject.create_blank_page(width=612, height=792)
+        lines = [line.format(page=page_number, pages=pages)
+                 for line in PAGE_LINES * 4]
+        text = "".join(f"({line}) Tj T* " for line in lines)
+        content = DecodedStreamObject()
+        content.set_data(
+            f"BT /F1 11 Tf 14 TL 72 740 Td {text}ET".encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = resources
+        writer.add_page(page)
+
+    with open(path, "wb") as pdf_file:
+        writer.write(pdf_file)
+
+
+class StubEngine:
+    # Writes a WAV with one frame per character instead of speaking. It only
+    # replaces the engine in this process, so synthesis is measured serially.
+
+    def __init__(self):
+        self.queued = []
+
+    def getProperty(self, name):
+        return 200
+
+    def setProperty(self, name, value):
+        pass
+
+    def save_to_file(self, text, path):
+        self.queued.append((text, path))
+
+    def runAndWait(self):
+        for text, path in self.queued:
+            with wave.open(path, "wb") as audio_file:
+                audio_file.setnchannels(1)
+                audio_file.setsampwidth(2)
+                audio_file.setframerate(16000)
+                audio_file.writeframes(b"\0\0" * max(len(text), 1))
+        self.queued = []
+
+    def stop(self):
+        pass
+
+
+def time_stage(stage, pdf_path):
+    from app import synthesis
+    from app.extraction import extract_pages
+    from app.synthesis import TTSEngineManager, iter_chunks, remove_segment, synthesize_segments
+    from app.text_filter import filter_pages
+
+    pages = extract_pages(pdf_path)
+    texts = list(filter_pages(pages))
+    chunks = list(iter_chunks(texts))
+    synthesis.engine_manager = TTSEngineManager(factory=StubEngine)
+
+    start = time.perf_counter()
+    if stage == "extraction":
+        extract_pages(pdf_path)
+    elif stage == "filtering":
+        # Includes the running header and footer detection across pages
+        list(filter_pages(pages))
+    elif stage == "chunking":
+        list(iter_chunks(texts))
+    elif stage == "synthesis":
+        for segment_path in synthesize_segments(chunks):
+            remove_segment(segment_path)
+
+    return time.perf_counter() - start, len(pages)
+
+
+def run_case(stage, pdf_path, repetitions, results):
+    latencies = []
+    for _ in range(repetitions):
+        seconds, page_count = time_stage(stage, pdf_path)
+        latencies.append(seconds)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+
+    results.put({
+        "latencies": latencies,
+        "pages": page_count,
+        "peak_rss_bytes": peak_rss
+    })
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def measure(stage, pdf_path, repetitions):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_case, args=(
+        stage, pdf_path, repetitions, results))
+    process.start()
+    case = results.get()
+    process.join()
+
+    p50 = statistics.median(case["latencies"])
+    return {
+        "p50_seconds": p50,
+        "p99_seconds": percentile(case["latencies"], 0.99),
+        "pages_per_second": case["pages"] / p50 if p50 else None,
+        "peak_rss_bytes": case["peak_rss_bytes"]
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, case in results["cases"].items():
+        base_case = baseline["cases"].get(name)
+        if not base_case:
+            continue
+        if case["p50_seconds"] > base_case["p50_seconds"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {case['p50_seconds']:.4f}s vs baseline {base_case['p50_seconds']:.4f}s")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=DEFAULT_PAGES)
+    parser.add_argument("--stages", nargs="+",
+                        choices=STAGES, default=STAGES)
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="allowed p50 slowdown before failing, 0.1 = 10%%")
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "cases": {}
+    }
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for pages in args.pages:
+            pdf_path = os.path.join(temp_dir, f"synthetic-{pages}.pdf")
+            generate_pdf(pdf_path, pages)
+
+            for stage in args.stages:
+                name = f"{stage}/{pages}"
+                case = measure(stage, pdf_path, args.repetitions)
+                results["cases"][name] = case
+                print(f"{name:>18}: p50 {case['p50_seconds'] * 1000:9.2f} ms  "
+                      f"p99 {case['p99_seconds'] * 1000:9.2f} ms  "
+                      f"{case['pages_per_second'] or 0:10.1f} pages/s  "
+                      f"rss {case['peak_rss_bytes'] / (1024 * 1024):7.1f} MB")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(
+                baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Per-job synthesis latency with a new engine per job (the old behaviour)
+# versus the warm engine kept by TTSEngineManager.
+#
+#   python -m benchmarks.bench_tts_engine --jobs 20
+#
+# Needs a working pyttsx3 driver (espeak, nsss or sapi5).
+import argparse
+import statistics
+import time
+import pyttsx3
+from app.synthesis import TTSEngineManager, remove_segment, render_chunk
+
+TEXT = "Scalability is the ability to adjust the capacity of the system. " * 5
+
+
+def run_cold_job(text):
+    tts_engine = pyttsx3.init()
+    segment_path = render_chunk(text, None, None, tts_engine)
+    # pyttsx3 caches engines while they are referenced, drop it so the next
+    # job starts the driver again like a fresh job did
+    tts_engine.stop()
+    del tts_engine
+    return segment_path
+
+
+def measure(run_job, jobs):
+    latencies = []
+    for _ in range(jobs):
+        start = time.perf_counter()
+        remove_segment(run_job(TEXT))
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+def report(name, latencies):
+    print(f"{name:>5}: mean {statistics.mean(latencies) * 1000:8.1f} ms  "
+          f"p50 {statistics.median(latencies) * 1000:8.1f} ms  "
+          f"max {max(latencies) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=10)
+    args = parser.parse_args()
+
+    report("cold", measure(run_cold_job, args.jobs))
+
+    manager = TTSEngineManager()
+    manager.get()
+    report("warm", measure(manager.render, args.jobs))
+
+
+if __name__ == "__main__":
+    main()
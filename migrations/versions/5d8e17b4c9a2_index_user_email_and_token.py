@@ -0,0 +1,28 @@
+"""index user email and token
+
+Revision ID: 5d8e17b4c9a2
+Revises: c27b5e8f0a13
+Create Date: 2026-10-18 13:42:09.716503
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8e17b4c9a2'
+down_revision = 'c27b5e8f0a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fails if the table already holds emails that differ only in case,
+    # those rows have to be merged first
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_email_lower', [sa.text('lower(email)')], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_email_lower')
@@ -0,0 +1,32 @@
+"""schedule conversions by size
+
+Revision ID: 7e3a9c41b6d8
+Revises: 5d8e17b4c9a2
+Create Date: 2026-10-18 13:42:51.904116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e3a9c41b6d8'
+down_revision = '5d8e17b4c9a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversion_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('page_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('size_class', sa.String(length=8), server_default='small', nullable=False))
+        batch_op.add_column(sa.Column('dispatched_on', sa.TIMESTAMP(timezone=True), nullable=True))
+        batch_op.create_index('ix_conversion_job_size_class_status', ['size_class', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('conversion_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversion_job_size_class_status')
+        batch_op.drop_column('dispatched_on')
+        batch_op.drop_column('size_class')
+        batch_op.drop_column('page_count')
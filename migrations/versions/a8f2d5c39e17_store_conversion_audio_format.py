@@ -0,0 +1,26 @@
+"""store conversion audio format
+
+Revision ID: a8f2d5c39e17
+Revises: 7e3a9c41b6d8
+Create Date: 2026-10-18 15:07:33.261480
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8f2d5c39e17'
+down_revision = '7e3a9c41b6d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversion_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('audio_format', sa.String(length=8), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('conversion_job', schema=None) as batch_op:
+        batch_op.drop_column('audio_format')
@@ -0,0 +1,41 @@
+"""add conversion batch
+
+Revision ID: d41c7e0b9a56
+Revises: a8f2d5c39e17
+Create Date: 2026-10-18 16:24:12.580391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c7e0b9a56'
+down_revision = 'a8f2d5c39e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('conversion_batch',
+    sa.Column('batch_id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_on', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ),
+    sa.PrimaryKeyConstraint('batch_id')
+    )
+    with op.batch_alter_table('conversion_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('batch_id', sa.String(length=32), nullable=True))
+        batch_op.add_column(sa.Column('file_name', sa.String(length=255), nullable=True))
+        batch_op.create_index(batch_op.f('ix_conversion_job_batch_id'), ['batch_id'], unique=False)
+        batch_op.create_foreign_key('fk_conversion_job_batch_id', 'conversion_batch', ['batch_id'], ['batch_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('conversion_job', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_conversion_job_batch_id', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_conversion_job_batch_id'))
+        batch_op.drop_column('file_name')
+        batch_op.drop_column('batch_id')
+
+    op.drop_table('conversion_batch')
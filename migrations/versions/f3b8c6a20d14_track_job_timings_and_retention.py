@@ -0,0 +1,46 @@
+"""track job timings and retention
+
+Revision ID: f3b8c6a20d14
+Revises: d41c7e0b9a56
+Create Date: 2026-10-18 18:42:09.517306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8c6a20d14'
+down_revision = 'd41c7e0b9a56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversion_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pdf_size', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('audio_size', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('started_on', sa.TIMESTAMP(timezone=True), nullable=True))
+        batch_op.add_column(sa.Column('expires_on', sa.TIMESTAMP(timezone=True), nullable=True))
+        batch_op.create_index(batch_op.f('ix_conversion_job_expires_on'), ['expires_on'], unique=False)
+        batch_op.create_index('ix_conversion_job_user_id_created_on', ['user_id', 'created_on'], unique=False)
+
+    # Jobs that ended before this migration are kept for the default
+    # retention of 30 days from their creation
+    if op.get_bind().dialect.name == 'postgresql':
+        expires_on = "created_on + interval '30 days'"
+    else:
+        expires_on = "datetime(created_on, '+30 days')"
+    op.execute(
+        f"UPDATE conversion_job SET expires_on = {expires_on} "
+        "WHERE status IN ('finished', 'failed') AND expires_on IS NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('conversion_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversion_job_user_id_created_on')
+        batch_op.drop_index(batch_op.f('ix_conversion_job_expires_on'))
+        batch_op.drop_column('expires_on')
+        batch_op.drop_column('started_on')
+        batch_op.drop_column('audio_size')
+        batch_op.drop_column('pdf_size')
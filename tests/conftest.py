@@ -1,13 +1,29 @@
 from flask import request_finished
 import pytest
+from dramatiq import Worker
 from app import create_app, db
 from app.models.user import User
 from werkzeug.security import generate_password_hash
 
 
 @pytest.fixture
-def app():
-    app = create_app({"TESTING": True})
+def app(request, tmp_path):
+    # Every test gets its own uploads, audio store and OCR cache. Tests can
+    # add config with indirect parametrization.
+    app = create_app({
+        "TESTING": True,
+        "UPLOAD_FOLDER": str(tmp_path / "uploads"),
+        "AUDIO_STORAGE_PATH": str(tmp_path / "audio"),
+        "OCR_CACHE_PATH": str(tmp_path / "ocr"),
+        # Don't leave delayed segment cleanup behind in the stub broker
+        "SEGMENT_RETENTION": 0,
+        # Tests run the sweep themselves
+        "JOB_SWEEP_INTERVAL": 0,
+        "PASSWORD_HASH_WORKERS": 0,
+        # Store the rendered audio as is, the tests don't need ffmpeg
+        "AUDIO_FORMAT": "wav",
+        **getattr(request, "param", {})
+    })
 
     @request_finished.connect_via(app)
     def expire_session(sender, response, **extra):
@@ -26,6 +42,21 @@ def client(app):
     return app.test_client()
 
 
+@pytest.fixture
+def stub_broker(app):
+    broker = app.extensions["dramatiq-dramatiq"].broker
+    broker.flush_all()
+    return broker
+
+
+@pytest.fixture
+def stub_worker(stub_broker):
+    worker = Worker(stub_broker, worker_timeout=100)
+    worker.start()
+    yield worker
+    worker.stop()
+
+
 @pytest.fixture
 def user_1(app):
     user = User(
@@ -40,3 +71,14 @@ def user_1(app):
 
     db.session.add(user)
     db.session.commit()
+
+
+@pytest.fixture
+def login(client, user_1):
+    def login():
+        return client.post("/login", json={
+            "email": "test@example.com",
+            "password": "password"
+        })
+
+    return login
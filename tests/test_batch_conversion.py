@@ -0,0 +1,135 @@
+import os
+import zipfile
+from io import BytesIO
+from app.tasks import convert_large_pdf_to_audio, dispatch_large_conversions
+
+PDF_FILE_PATH = "tests/static/scalability 1.pdf"
+
+
+def pdf_bytes():
+    with open(PDF_FILE_PATH, "rb") as pdf_file:
+        return pdf_file.read()
+
+
+def zip_bytes(members):
+    archive_file = BytesIO()
+    with zipfile.ZipFile(archive_file, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    archive_file.seek(0)
+    return archive_file
+
+
+def test_batch_deduplicates_files_and_reports_progress(app, client, user_1, stub_broker, stub_worker, login):
+    archive = zip_bytes({
+        "chapter-1.pdf": pdf_bytes(),
+        "copies/chapter-1-again.pdf": pdf_bytes(),
+        "notes.txt": b"not a document"
+    })
+
+    with client:
+        login()
+        response = client.post("/users/convert-batch", data={
+            "files": [(BytesIO(pdf_bytes()), "intro.pdf"), (archive, "course.zip")]
+        }, content_type="multipart/form-data")
+
+        assert response.status_code == 202, response.data
+        batch = response.get_json()
+        files = batch["files"]
+
+        assert [entry["file_name"] for entry in files] == [
+            "intro.pdf", "chapter-1.pdf", "chapter-1-again.pdf"]
+        assert files[1]["job_id"] == files[0]["job_id"]
+        assert files[1]["duplicate_of"] == "intro.pdf"
+
+        stub_broker.join(dispatch_large_conversions.queue_name)
+        stub_broker.join(convert_large_pdf_to_audio.queue_name)
+        stub_worker.join()
+
+        status = client.get(batch["status_url"]).get_json()
+
+        assert status["status"] == "finished"
+        assert status["job_count"] == 1
+        assert status["progress"] == 1.0
+
+        response = client.get(batch["download_url"])
+
+        assert response.status_code == 200
+        with zipfile.ZipFile(BytesIO(response.data)) as archive:
+            assert archive.namelist() == ["intro.wav"]
+
+
+def test_batch_rejects_too_many_files(app, client, user_1, login):
+    app.config["BATCH_MAX_FILES"] = 1
+
+    with client:
+        login()
+        response = client.post("/users/convert-batch", data={
+            "files": [(BytesIO(pdf_bytes()), "a.pdf"), (BytesIO(pdf_bytes() + b"\n"), "b.pdf")]
+        }, content_type="multipart/form-data")
+
+        assert response.status_code == 400
+        assert os.listdir(app.config["UPLOAD_FOLDER"]) == []
+
+
+def test_batch_rejects_unreadable_archive_member(app, client, user_1, login):
+    data = bytearray(zip_bytes({"a.pdf": pdf_bytes(), "b.pdf": pdf_bytes()}).getvalue())
+    # Mark b.pdf as encrypted in the central directory, zipfile can't open
+    # it without a password
+    entry = data.rindex(b"PK\x01\x02")
+    assert data[entry + 46:entry + 51] == b"b.pdf"
+    data[entry + 8] |= 0x1
+    archive_file = BytesIO(bytes(data))
+
+    with client:
+        login()
+        response = client.post("/users/convert-batch", data={
+            "files": [(archive_file, "course.zip")]
+        }, content_type="multipart/form-data")
+
+        assert response.status_code == 400
+        assert "b.pdf" in response.get_json()["message"]
+        assert os.listdir(app.config["UPLOAD_FOLDER"]) == []
+
+
+def test_batch_takes_a_rate_limit_token_per_document(app, client, user_1, stub_broker, login):
+    app.config["CONVERSION_USER_BURST"] = 3
+
+    def submit(count):
+        return client.post("/users/convert-batch", data={
+            "files": [(BytesIO(pdf_bytes() + b"\n" * index), f"{index}.pdf") for index in range(count)]
+        }, content_type="multipart/form-data")
+
+    with client:
+        login()
+
+        # More documents than the bucket holds can never be admitted
+        response = submit(4)
+        assert response.status_code == 413
+        assert "Retry-After" not in response.headers
+
+        assert submit(2).status_code == 202
+        response = submit(2)
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+        # Only the admitted batch left its uploads behind
+        assert len(os.listdir(app.config["UPLOAD_FOLDER"])) == 2
+
+
+def test_batch_over_the_rate_limit_is_rejected_before_reading_files(app, client, user_1, stub_broker, login, monkeypatch):
+    app.config["CONVERSION_USER_BURST"] = 1
+
+    def submit():
+        return client.post("/users/convert-batch", data={
+            "files": [(BytesIO(pdf_bytes()), "1.pdf")]
+        }, content_type="multipart/form-data")
+
+    with client:
+        login()
+        assert submit().status_code == 202
+
+        def iter_batch_files(uploads):
+            raise AssertionError("Files read after the rate limit")
+
+        monkeypatch.setattr("app.routes.iter_batch_files", iter_batch_files)
+        assert submit().status_code == 429
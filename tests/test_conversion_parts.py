@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import uuid
+import pytest
+from app import db, tasks
+from app.models.conversion_job import ConversionJob
+from app.models.user import User
+from app.storage import get_audio_storage
+from app.tasks import convert_large_pdf_to_audio, convert_pdf_to_audio, fail_conversion
+
+
+class FakePipeline:
+    # Renders a page range to a segment holding the range itself
+
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+
+    def __iter__(self):
+        fd, segment_path = tempfile.mkstemp(suffix=".mp3")
+        with os.fdopen(fd, "wb") as segment:
+            segment.write(f"[{self.start}-{self.stop}]".encode())
+        yield segment_path
+
+    def close(self):
+        pass
+
+    def record_metrics(self):
+        pass
+
+
+@pytest.fixture
+def rendered_ranges(monkeypatch):
+    ranges = []
+
+    def convert_pages(pdf_file_path, config, start=0, stop=None):
+        ranges.append((start, stop))
+        return FakePipeline(start, stop)
+
+    monkeypatch.setattr("app.tasks.convert_pages", convert_pages)
+    return ranges
+
+
+@pytest.fixture
+def job(app, user_1, tmp_path):
+    pdf_file_path = tmp_path / "scalability 1.pdf"
+    shutil.copy("tests/static/scalability 1.pdf", pdf_file_path)
+
+    job = ConversionJob(User.find_by_email("test@example.com").user_id,
+                        str(pdf_file_path), storage_key=uuid.uuid4().hex)
+    db.session.add(job)
+    db.session.commit()
+
+    return job
+
+
+def read_result(storage_key):
+    with get_audio_storage().open(storage_key) as audio_file:
+        return audio_file.read()
+
+
+def test_retry_only_renders_missing_parts(app, job, rendered_ranges, monkeypatch):
+    convert_part = tasks.convert_part
+
+    def crash_on_third_part(job, part, start, stop):
+        if part == 2:
+            raise RuntimeError("Worker died")
+        convert_part(job, part, start, stop)
+
+    monkeypatch.setattr("app.tasks.convert_part", crash_on_third_part)
+    with pytest.raises(RuntimeError):
+        convert_pdf_to_audio(job.job_id)
+
+    # The message will be retried, so the job is still running
+    assert job.status == "running"
+    assert job.error_message is None
+    assert job.segments_ready == 2
+    assert rendered_ranges == [(0, 10), (10, 20)]
+    rendered_ranges.clear()
+
+    monkeypatch.setattr("app.tasks.convert_part", convert_part)
+    convert_pdf_to_audio(job.job_id)
+
+    # The first two parts were checkpointed by the failed attempt
+    assert rendered_ranges == [(20, 30), (30, 34)]
+    assert job.status == "finished"
+    assert job.segment_count == 4
+    assert read_result(job.storage_key) == b"[0-10][10-20][20-30][30-34]"
+
+
+def test_job_fails_once_retries_are_used_up(app, job):
+    def message_data(retries):
+        return {"actor_name": convert_pdf_to_audio.actor_name,
+                "args": [job.job_id], "options": {"retries": retries}}
+
+    fail_conversion(message_data(3), {"message": "Worker died"})
+    assert job.status != "failed"
+
+    fail_conversion(message_data(4), {"message": "Worker died"})
+    assert job.status == "failed"
+    assert job.error_message == "Worker died"
+
+
+def test_large_conversion_fans_out_parts(app, job, rendered_ranges, stub_broker, stub_worker):
+    job.size_class = "large"
+    db.session.commit()
+
+    convert_large_pdf_to_audio(job.job_id)
+    stub_broker.join(convert_large_pdf_to_audio.queue_name)
+    stub_worker.join()
+
+    job = db.session.get(ConversionJob, job.job_id, populate_existing=True)
+
+    assert sorted(rendered_ranges) == [(0, 10), (10, 20), (20, 30), (30, 34)]
+    assert job.status == "finished"
+    assert job.segments_ready == 4
+    assert read_result(job.storage_key) == b"[0-10][10-20][20-30][30-34]"
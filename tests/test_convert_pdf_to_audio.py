@@ -1,4 +1,21 @@
-def test_convert_pdf(client, user_1):
+import os
+import tempfile
+from io import BytesIO
+from app import db, routes
+from app.models.conversion_job import ConversionJob
+from app.models.user import User
+from app.storage import get_audio_storage, segment_key
+from app.tasks import convert_pdf_to_audio
+
+
+def save_bytes(storage, key, data):
+    with tempfile.NamedTemporaryFile() as source:
+        source.write(data)
+        source.flush()
+        storage.save_file(key, source.name)
+
+
+def test_convert_pdf(client, user_1, stub_broker, stub_worker):
     pdf_file_path = "tests/static/scalability 1.pdf"
     with open(pdf_file_path, "rb") as pdf_file:
         data = {"file": (pdf_file, "scalability 1.pdf")}
@@ -15,7 +32,97 @@ def test_convert_pdf(client, user_1):
             response = client.post(
                 "/users/convert-pdf-to-audio", data=data, content_type='multipart/form-data')
 
-            assert response.status_code == 200, f"Conversion failed: {
+            assert response.status_code == 202, f"Conversion failed: {
+                response.data}"
+            job_id = response.get_json()["job_id"]
+
+            stub_broker.join(convert_pdf_to_audio.queue_name)
+            stub_worker.join()
+
+            status_response = client.get(f"/users/jobs/{job_id}")
+
+            assert status_response.status_code == 200
+            assert status_response.get_json()["status"] == "finished"
+
+            stream_response = client.get(f"/users/jobs/{job_id}/stream")
+
+            assert stream_response.status_code == 200
+            assert stream_response.data, "No audio streamed"
+
+            response = client.get(f"/users/jobs/{job_id}/download")
+
+            assert response.status_code == 200, f"Download failed: {
                 response.data}"
             assert "attachment" in response.headers.get(
                 "Content-Disposition", ""), "MP3 file not sent"
+
+            metrics_response = client.get("/metrics")
+
+            assert b'soundable_conversion_stage_seconds_count{stage="synthesis"}' in metrics_response.data
+
+
+def test_job_status_not_found(client, user_1):
+    with client:
+        client.post("/login", json={
+            "email": "test@example.com",
+            "password": "password"
+        })
+
+        response = client.get("/users/jobs/unknown")
+
+        assert response.status_code == 404
+
+
+def test_convert_pdf_rejects_file_over_size_limit(app, client, user_1):
+    app.config["MAX_PDF_SIZE"] = 1024
+    data = {"file": (BytesIO(b"%PDF-1.4" + b"0" * 2048), "large.pdf")}
+
+    with client:
+        client.post("/login", json={
+            "email": "test@example.com",
+            "password": "password"
+        })
+
+        response = client.post(
+            "/users/convert-pdf-to-audio", data=data, content_type='multipart/form-data')
+
+        assert response.status_code == 413
+        assert os.listdir(app.config["UPLOAD_FOLDER"]) == []
+
+
+def test_stream_releases_connection_and_ends_when_job_is_deleted(app, user_1, monkeypatch):
+    job = ConversionJob(User.find_by_email("test@example.com").user_id, None,
+                        storage_key="0" * 64, status="running")
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.job_id
+
+    def delete_job(seconds):
+        # No connection is held while the stream waits for the worker
+        assert db.engine.pool.checkedout() == 0
+        ConversionJob.query.filter_by(job_id=job_id).delete()
+        db.session.commit()
+
+    monkeypatch.setattr(routes.time, "sleep", delete_job)
+
+    assert list(routes.stream_segments(job_id, "0" * 64)) == []
+
+
+def test_stream_sends_only_the_finished_file_for_formats_without_parts(app, user_1, monkeypatch):
+    storage = get_audio_storage()
+    job = ConversionJob(User.find_by_email("test@example.com").user_id, None,
+                        storage_key="1" * 64, status="running")
+    job.segments_ready = 1
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.job_id
+    save_bytes(storage, segment_key(job.storage_key, 0), b"part")
+
+    def finish_job(seconds):
+        save_bytes(storage, "1" * 64, b"whole file")
+        ConversionJob.query.filter_by(job_id=job_id).update({"status": "finished"})
+        db.session.commit()
+
+    monkeypatch.setattr(routes.time, "sleep", finish_job)
+
+    assert b"".join(routes.stream_segments(job_id, "1" * 64, stream_parts=False)) == b"whole file"
@@ -0,0 +1,76 @@
+import uuid
+import pytest
+from app import db
+from app.models.conversion_job import ConversionJob
+from app.models.user import User
+from app.storage import get_audio_storage
+
+AUDIO = b"0123456789" * 10
+
+
+@pytest.fixture
+def finished_job(app, user_1, tmp_path):
+    audio_path = tmp_path / "audio.mp3"
+    audio_path.write_bytes(AUDIO)
+    storage_key = uuid.uuid4().hex
+    get_audio_storage().save_file(storage_key, str(audio_path))
+
+    job = ConversionJob(User.find_by_email("test@example.com").user_id, None,
+                        storage_key=storage_key, status="finished", audio_format="mp3")
+    db.session.add(job)
+    db.session.commit()
+
+    return job.job_id, storage_key
+
+
+def test_download_supports_ranges_and_etags(client, finished_job, login):
+    job_id, storage_key = finished_job
+
+    with client:
+        login()
+        response = client.get(f"/users/jobs/{job_id}/download")
+
+        assert response.status_code == 200
+        assert response.data == AUDIO
+        assert response.headers["ETag"] == f'"{storage_key}"'
+        assert response.headers["Accept-Ranges"] == "bytes"
+        assert "private" in response.headers["Cache-Control"]
+        assert "public" not in response.headers["Cache-Control"]
+
+        response = client.get(f"/users/jobs/{job_id}/download",
+                              headers={"Range": "bytes=10-19"})
+
+        assert response.status_code == 206
+        assert response.data == AUDIO[10:20]
+        assert response.headers["Content-Range"] == f"bytes 10-19/{len(AUDIO)}"
+
+        response = client.get(f"/users/jobs/{job_id}/download",
+                              headers={"If-None-Match": f'"{storage_key}"'})
+
+        assert response.status_code == 304
+        assert response.data == b""
+
+
+def test_download_offloaded_to_nginx(app, client, finished_job, login):
+    job_id, storage_key = finished_job
+    app.config["AUDIO_ACCEL_REDIRECT_PREFIX"] = "/protected-audio/"
+
+    with client:
+        login()
+        response = client.get(f"/users/jobs/{job_id}/download")
+
+        assert response.status_code == 200
+        assert response.data == b""
+        assert response.headers["X-Accel-Redirect"] == (
+            f"/protected-audio/{storage_key[:2]}/{storage_key}.mp3")
+        assert response.headers["Content-Disposition"] == f"attachment; filename={job_id}.mp3"
+
+        assert response.headers["ETag"] == f'"{storage_key}"'
+        assert "private" in response.headers["Cache-Control"]
+
+        # Answered without handing the file to nginx
+        response = client.get(f"/users/jobs/{job_id}/download",
+                              headers={"If-None-Match": f'"{storage_key}"'})
+
+        assert response.status_code == 304
+        assert "X-Accel-Redirect" not in response.headers
@@ -0,0 +1,126 @@
+import re
+import shutil
+import stat
+import subprocess
+import sys
+import wave
+import pytest
+from app.encoding import AudioEncoder, get_audio_format, join_parts, open_encoder
+from app.synthesis import SegmentConcatenator
+
+# Stands in for ffmpeg: writes its arguments and then stdin to the output
+FAKE_FFMPEG = f"""#!{sys.executable}
+import sys
+with open(sys.argv[-1], "wb") as output:
+    output.write(" ".join(sys.argv[1:-1]).encode() + b"\\n")
+    output.write(sys.stdin.buffer.read())
+"""
+
+
+def write_wav(path, frames, frame_rate=8000):
+    with wave.open(str(path), "wb") as segment:
+        segment.setnchannels(1)
+        segment.setsampwidth(2)
+        segment.setframerate(frame_rate)
+        segment.writeframes(frames)
+    return str(path)
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    path = tmp_path / "ffmpeg"
+    path.write_text(FAKE_FFMPEG)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def test_encoder_pipes_segment_frames_to_ffmpeg(tmp_path, fake_ffmpeg):
+    output_path = str(tmp_path / "part.mp3")
+    encoder = AudioEncoder(output_path, "mp3", "48k", fake_ffmpeg)
+    encoder.append(write_wav(tmp_path / "0.wav", b"\x01\x00" * 4))
+    encoder.append(write_wav(tmp_path / "1.wav", b"\x02\x00" * 4))
+    encoder.close()
+
+    with open(output_path, "rb") as output:
+        arguments, frames = output.read().split(b"\n", 1)
+
+    assert b"-f s16le -ar 8000 -ac 1 -i pipe:0" in arguments
+    assert b"libmp3lame" in arguments and b"-b:a 48k" in arguments
+    assert frames == b"\x01\x00" * 4 + b"\x02\x00" * 4
+
+
+def test_encoder_rejects_segments_with_another_sample_rate(tmp_path, fake_ffmpeg):
+    encoder = AudioEncoder(str(tmp_path / "part.mp3"), ffmpeg=fake_ffmpeg)
+    encoder.append(write_wav(tmp_path / "0.wav", b"\x00\x00"))
+
+    with pytest.raises(ValueError):
+        encoder.append(write_wav(tmp_path / "1.wav", b"\x00\x00", 16000))
+    encoder.close()
+
+
+def test_open_encoder_without_ffmpeg(tmp_path):
+    config = {"FFMPEG_PATH": "missing-ffmpeg", "AUDIO_BITRATE": "64k"}
+
+    assert isinstance(open_encoder(str(tmp_path / "part.wav"), "wav", config),
+                      SegmentConcatenator)
+    with pytest.raises(RuntimeError):
+        open_encoder(str(tmp_path / "part.mp3"), "mp3", config)
+
+
+def test_legacy_jobs_are_labelled_mp3():
+    assert get_audio_format(None)[1] == "audio/mpeg"
+    assert get_audio_format("opus")[:2] == ("ogg", "audio/ogg")
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+@pytest.mark.parametrize("audio_format", ["mp3", "opus"])
+def test_joined_parts_play_for_their_full_length(tmp_path, audio_format):
+    config = {"FFMPEG_PATH": "ffmpeg", "AUDIO_BITRATE": "64k"}
+    part_paths = []
+    for part in range(2):
+        # One second of audio per part
+        part_path = str(tmp_path / f"{part}.part")
+        encoder = open_encoder(part_path, audio_format, config)
+        encoder.append(write_wav(tmp_path / f"{part}.wav",
+                                 b"\x00\x10\x00\xf0" * 12000, 24000))
+        encoder.close()
+        part_paths.append(part_path)
+
+    output_path = str(tmp_path / "audio")
+    join_parts(part_paths, output_path, audio_format, config)
+
+    # The duration players read from the headers, not just decodable frames
+    probe = subprocess.run(["ffmpeg", "-hide_banner", "-i", output_path],
+                           stderr=subprocess.PIPE, text=True).stderr
+    hours, minutes, seconds = re.search(
+        r"Duration: (\d+):(\d+):([\d.]+)", probe).groups()
+
+    assert abs(int(hours) * 3600 + int(minutes) * 60 + float(seconds) - 2) < 0.15
+    with open(output_path, "rb") as output:
+        data = output.read()
+    if audio_format == "mp3":
+        assert data.count(b"Xing") + data.count(b"Info") == 1
+    else:
+        # A single logical stream, not a chain
+        assert data.count(b"OpusHead") == 1
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_encoder_decodes_segments_that_are_not_wav(tmp_path):
+    # The macOS driver renders AIFF
+    aiff_path = str(tmp_path / "0.aiff")
+    subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error",
+                    "-i", write_wav(tmp_path / "0.wav", b"\x00\x10" * 8000),
+                    "-ar", "22050", aiff_path], check=True)
+
+    output_path = str(tmp_path / "part.mp3")
+    encoder = AudioEncoder(output_path)
+    encoder.append(aiff_path)
+    encoder.append(write_wav(tmp_path / "1.wav", b"\x00\x10" * 22050, 22050))
+    encoder.close()
+
+    probe = subprocess.run(["ffmpeg", "-hide_banner", "-i", output_path],
+                           stderr=subprocess.PIPE, text=True).stderr
+    seconds = float(re.search(r"Duration: \d+:\d+:([\d.]+)", probe).group(1))
+
+    assert abs(seconds - 2) < 0.15
@@ -0,0 +1,11 @@
+from app.extraction import extract_pages, iter_pages
+
+PDF_FILE_PATH = "tests/static/scalability 1.pdf"
+
+
+def test_page_range_extraction_matches_full_document():
+    pages = extract_pages(PDF_FILE_PATH)
+
+    assert len(pages) == 34
+    assert list(iter_pages(PDF_FILE_PATH, start=10, stop=20)) == pages[10:20]
+    assert list(iter_pages(PDF_FILE_PATH, start=30, stop=100)) == pages[30:]
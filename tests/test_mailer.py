@@ -0,0 +1,47 @@
+import smtplib
+from app import mailer
+from app.mailer import MailConnectionPool
+
+
+class FakeHost:
+    def __init__(self):
+        self.dropped = False
+
+    def noop(self):
+        if self.dropped:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        return 250, b"OK"
+
+    def quit(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.host = FakeHost()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.host.quit()
+
+
+def test_idle_connection_is_checked_before_reuse(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.mailer.time.monotonic", lambda: now[0])
+    monkeypatch.setattr(mailer.mail, "connect", FakeConnection)
+    pool = MailConnectionPool(idle_timeout=60, check_after=10)
+
+    connection = pool.get()
+    now[0] += 5
+    assert pool.get() is connection
+
+    # Still alive after a while, keep it
+    now[0] += 20
+    assert pool.get() is connection
+
+    # Dropped by the server, replaced before anything is sent on it
+    connection.host.dropped = True
+    now[0] += 20
+    assert pool.get() is not connection
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+# Multiprocess mode is picked when prometheus_client is imported, so the
+# app runs in a fresh interpreter
+MULTIPROCESS_SCRIPT = """
+from sqlalchemy import text
+from app import create_app, db
+
+app = create_app({"TESTING": True})
+with app.app_context():
+    # Scraped while this connection is checked out
+    db.session.execute(text("SELECT 1"))
+    print(app.test_client().get("/metrics").get_data(as_text=True))
+"""
+
+
+def test_metrics_exposes_db_pool_usage(client, user_1):
+    client.post("/login", json={
+        "email": "test@example.com",
+        "password": "password"
+    })
+
+    response = client.get("/metrics")
+
+    assert b"soundable_db_pool_checked_out" in response.data
+    assert b"soundable_db_pool_checkout_seconds_count" in response.data
+
+
+def test_metrics_exposes_request_latency_and_queue_depth(client, user_1):
+    client.post("/login", json={
+        "email": "test@example.com",
+        "password": "password"
+    })
+
+    response = client.get("/metrics")
+
+    assert b'soundable_request_latency_seconds_count{blueprint="p",endpoint="p.user_login"' in response.data
+    assert b"soundable_queue_depth" in response.data
+
+
+def test_gauges_are_exported_in_multiprocess_mode(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    result = subprocess.run([sys.executable, "-c", MULTIPROCESS_SCRIPT], env=env,
+                            capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert "soundable_db_pool_checked_out 1.0" in result.stdout
+    assert "soundable_db_pool_overflow" in result.stdout
+    assert "soundable_password_hash_queue_depth 0.0" in result.stdout
@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from app.ocr import cache_path, needs_ocr, prune_cache, read_cached_text, recognize_pages, write_cached_text
+
+TEXT_PAGE = "Scalability is the ability to adjust the capacity of the system."
+CONFIG = {
+    "OCR_ENABLED": True,
+    "OCR_MIN_CHARS": 20,
+    "OCR_LANGUAGE": "eng",
+    "OCR_WORKERS": 2,
+    "OCR_CACHE_PATH": "unused"
+}
+
+
+def test_needs_ocr_only_for_pages_without_text():
+    assert needs_ocr("")
+    assert needs_ocr(" 12 \n . ")
+    assert not needs_ocr(TEXT_PAGE)
+
+
+def test_recognize_pages_only_sends_scanned_pages_to_ocr(monkeypatch):
+    recognized = []
+
+    def ocr_page(pdf_file_path, page_index, language, cache_dir):
+        recognized.append(page_index)
+        return f"Recognized page {page_index}"
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr("app.ocr.ocr_available", lambda: True)
+    monkeypatch.setattr("app.ocr.get_executor", lambda workers: executor)
+    monkeypatch.setattr("app.ocr.ocr_page", ocr_page)
+
+    texts = [TEXT_PAGE, "", TEXT_PAGE, " 7 ", TEXT_PAGE]
+    pages = list(recognize_pages(iter(texts), "scan.pdf", CONFIG, start=10))
+
+    assert pages == [TEXT_PAGE, "Recognized page 11",
+                     TEXT_PAGE, "Recognized page 13", TEXT_PAGE]
+    assert sorted(recognized) == [11, 13]
+
+
+def test_recognize_pages_passes_through_when_disabled():
+    texts = [TEXT_PAGE, ""]
+
+    assert list(recognize_pages(iter(texts), "scan.pdf",
+                dict(CONFIG, OCR_ENABLED=False))) == texts
+
+
+def test_prune_cache_keeps_pages_in_use(tmp_path):
+    cache_dir = str(tmp_path)
+    write_cached_text(cache_dir, "aa11", "used")
+    write_cached_text(cache_dir, "bb22", "unused")
+    for digest in ("aa11", "bb22"):
+        os.utime(cache_path(cache_dir, digest), (1000, 1000))
+
+    # Reading a page counts as use
+    assert read_cached_text(cache_dir, "aa11") == "used"
+
+    assert prune_cache(cache_dir, max_age=60) == 1
+    assert read_cached_text(cache_dir, "aa11") == "used"
+    assert read_cached_text(cache_dir, "bb22") is None
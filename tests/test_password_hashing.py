@@ -0,0 +1,33 @@
+from werkzeug.security import generate_password_hash
+from app.hashing import PasswordHasher
+from app.models.user import User
+
+
+def test_needs_rehash_when_parameters_change():
+    password_hasher = PasswordHasher(method="pbkdf2:sha256:600000")
+
+    assert not password_hasher.needs_rehash(
+        generate_password_hash("password", method="pbkdf2:sha256:600000"))
+    assert password_hasher.needs_rehash(
+        generate_password_hash("password", method="pbkdf2:sha256:1000"))
+
+
+def test_login_rehashes_outdated_password(app, client, user_1):
+    app.extensions["password_hasher"] = PasswordHasher(
+        method="pbkdf2:sha256:1000")
+
+    response = client.post("/login", json={
+        "email": "test@example.com",
+        "password": "password"
+    })
+
+    assert response.status_code == 200
+    db_user = User.find_by_email("test@example.com")
+    assert db_user.password.startswith("pbkdf2:sha256:1000$")
+
+
+def test_metrics_exposes_hash_queue_depth(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert b"soundable_password_hash_queue_depth" in response.data
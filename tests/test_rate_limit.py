@@ -0,0 +1,84 @@
+import pytest
+from app.rate_limit import RateLimiter
+
+
+class FailingScript:
+    def __call__(self, keys, args):
+        raise ConnectionError("Redis is down")
+
+
+class FakeRedis:
+    def register_script(self, script):
+        return FailingScript()
+
+
+def submit_pdf(client, **kwargs):
+    with open("tests/static/scalability 1.pdf", "rb") as pdf_file:
+        return client.post("/users/convert-pdf-to-audio",
+                           data={"file": (pdf_file, "scalability 1.pdf")},
+                           content_type='multipart/form-data', **kwargs)
+
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.rate_limit.time.monotonic", lambda: now[0])
+    rate_limiter = RateLimiter()
+
+    assert rate_limiter.acquire("user:1", 2, 0.5) == (True, 0)
+    assert rate_limiter.acquire("user:1", 2, 0.5) == (True, 0)
+    assert rate_limiter.acquire("user:1", 2, 0.5) == (False, 2.0)
+    assert rate_limiter.acquire("user:2", 2, 0.5)[0]
+
+    now[0] += 2
+
+    assert rate_limiter.acquire("user:1", 2, 0.5) == (True, 0)
+
+
+def test_rate_limiter_falls_back_to_memory_when_redis_fails():
+    rate_limiter = RateLimiter(redis_client=FakeRedis())
+
+    assert rate_limiter.acquire("user:1", 1, 1)[0]
+    assert not rate_limiter.acquire("user:1", 1, 1)[0]
+
+
+def test_convert_pdf_rate_limited_per_user(app, client, user_1, stub_broker, login):
+    app.config["CONVERSION_USER_BURST"] = 1
+
+    with client:
+        login()
+
+        assert submit_pdf(client).status_code == 202
+
+        response = submit_pdf(client)
+
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) > 0
+
+
+def test_convert_pdf_rejected_when_queue_is_full(app, client, user_1, stub_broker, login):
+    app.config["CONVERSION_MAX_QUEUE_DEPTH"] = 0
+
+    with client:
+        login()
+        response = submit_pdf(client)
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "30"
+        assert b'soundable_conversions_rejected_total{reason="queue_full"}' in client.get(
+            "/metrics").data
+
+
+@pytest.mark.parametrize("app", [{"PROXY_FIX_X_FOR": 1}], indirect=True)
+def test_convert_pdf_rate_limited_per_forwarded_client(app, client, user_1, stub_broker, login):
+    app.config["CONVERSION_IP_BURST"] = 1
+
+    def submit_from(client_ip):
+        return submit_pdf(client, headers={"X-Forwarded-For": client_ip})
+
+    with client:
+        login()
+
+        assert submit_from("203.0.113.1").status_code == 202
+        assert submit_from("203.0.113.1").status_code == 429
+        # Same proxy, another client
+        assert submit_from("203.0.113.2").status_code == 202
@@ -0,0 +1,68 @@
+import os
+import time
+from app.cache import ResultCache
+from app.storage import LocalAudioStorage
+
+
+def store(cache, tmp_path, key, size, last_access=None):
+    source = tmp_path / f"{key}.source"
+    source.write_bytes(b"x" * size)
+    cache.put(key, str(source))
+    if last_access:
+        path = cache.storage.path(key)
+        os.utime(path, (last_access, os.stat(path).st_mtime))
+
+
+def test_cache_hits_and_misses(tmp_path):
+    cache = ResultCache(LocalAudioStorage(
+        str(tmp_path / "audio")), max_bytes=100, ttl=60)
+
+    assert not cache.get("a" * 64)
+    store(cache, tmp_path, "a" * 64, 10)
+    assert cache.get("a" * 64)
+
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(LocalAudioStorage(
+        str(tmp_path / "audio")), max_bytes=25, ttl=60)
+    now = time.time()
+
+    store(cache, tmp_path, "a" * 64, 10, last_access=now - 30)
+    store(cache, tmp_path, "b" * 64, 10, last_access=now - 20)
+    store(cache, tmp_path, "c" * 64, 10)
+
+    assert not cache.storage.exists("a" * 64)
+    assert cache.storage.exists("b" * 64)
+    assert cache.storage.exists("c" * 64)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_expires_entries_after_ttl(tmp_path):
+    cache = ResultCache(LocalAudioStorage(
+        str(tmp_path / "audio")), max_bytes=100, ttl=60)
+    store(cache, tmp_path, "a" * 64, 10)
+    path = cache.storage.path("a" * 64)
+    os.utime(path, (time.time(), time.time() - 120))
+
+    assert not cache.get("a" * 64)
+    assert not cache.storage.exists("a" * 64)
+
+
+def test_cache_only_walks_storage_when_over_the_limit(tmp_path):
+    cache = ResultCache(LocalAudioStorage(
+        str(tmp_path / "audio")), max_bytes=25, ttl=60)
+    walks = []
+    entries = cache.storage.entries
+    cache.storage.entries = lambda: walks.append(1) or entries()
+
+    # The first put learns the size of the store
+    store(cache, tmp_path, "a" * 64, 10)
+    store(cache, tmp_path, "b" * 64, 10)
+    assert len(walks) == 1
+
+    store(cache, tmp_path, "c" * 64, 10)
+    assert len(walks) == 2
+    assert cache.total_bytes == 20
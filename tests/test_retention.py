@@ -0,0 +1,117 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+from app import db
+from app.models.conversion_batch import ConversionBatch
+from app.models.conversion_job import ConversionJob
+from app.models.user import User
+from app.retention import delete_expired_jobs
+from app.storage import get_audio_storage, segment_key
+from app.tasks import sweep_expired_jobs
+
+
+def add_job(user_id, job_id, minutes_ago, status="finished", expires_in=None, **kwargs):
+    job = ConversionJob(user_id, None, storage_key=f"{job_id:0>64}", job_id=job_id,
+                        status=status, **kwargs)
+    job.created_on = datetime.now() - timedelta(minutes=minutes_ago)
+    if expires_in is not None:
+        job.expires_on = datetime.now() + timedelta(minutes=expires_in)
+    db.session.add(job)
+    db.session.commit()
+
+    return job
+
+
+def test_job_history_is_paginated_newest_first(app, client, user_1):
+    user_1 = User.find_by_email("test@example.com")
+    user_2 = User("Other User", "other@example.com", "hash", None, None)
+    db.session.add(user_2)
+    db.session.commit()
+
+    for minutes_ago in range(5):
+        add_job(user_1.user_id, f"job{minutes_ago}", minutes_ago)
+    add_job(user_2.user_id, "other", 0)
+
+    with client:
+        client.post("/login", json={
+            "email": "test@example.com",
+            "password": "password"
+        })
+
+        job_ids = []
+        cursor = ""
+        while cursor is not None:
+            response = client.get(f"/users/jobs?limit=2&cursor={cursor}")
+            assert response.status_code == 200
+            assert len(response.json["jobs"]) <= 2
+            job_ids += [job["job_id"] for job in response.json["jobs"]]
+            cursor = response.json["next_cursor"]
+
+        assert job_ids == ["job0", "job1", "job2", "job3", "job4"]
+
+        assert client.get("/users/jobs?cursor=nonsense").status_code == 400
+        assert client.get("/users/jobs?limit=0").status_code == 400
+
+
+def test_sweep_deletes_expired_jobs_and_their_files(app, user_1):
+    user_1 = User.find_by_email("test@example.com")
+    storage = get_audio_storage()
+
+    # A failed job keeps its upload and finished parts for a retry
+    fd, upload_path = tempfile.mkstemp(
+        dir=app.config["UPLOAD_FOLDER"], suffix=".pdf")
+    os.close(fd)
+    failed = add_job(user_1.user_id, "failed", 60, status="failed",
+                     expires_in=-10)
+    failed.pdf_file_path = upload_path
+    failed.segment_count = 2
+    db.session.commit()
+    part_key = segment_key(failed.storage_key, 0)
+    with tempfile.NamedTemporaryFile() as part_file:
+        storage.save_file(part_key, part_file.name)
+
+    batch = ConversionBatch(user_1.user_id)
+    batch_id = batch.batch_id
+    db.session.add(batch)
+    add_job(user_1.user_id, "expired", 60, expires_in=-5, batch_id=batch_id)
+    add_job(user_1.user_id, "kept", 60, expires_in=10)
+    # Retried after it expired, it is running again
+    add_job(user_1.user_id, "running", 60, status="running", expires_in=-5)
+
+    assert delete_expired_jobs(storage, batch_size=1) == 2
+
+    assert not os.path.exists(upload_path)
+    assert not storage.exists(part_key)
+    assert db.session.get(ConversionBatch, batch_id) is None
+    assert sorted(job.job_id for job in ConversionJob.query) == ["kept", "running"]
+
+
+def test_sweep_reschedules_itself_once_per_interval(app, stub_broker):
+    app.config["JOB_SWEEP_INTERVAL"] = 60
+
+    # A second worker booting right after the first one
+    sweep_expired_jobs()
+    sweep_expired_jobs()
+
+    assert stub_broker.queues["default.DQ"].qsize() == 1
+
+
+def test_sweep_keeps_segments_of_a_running_job_with_the_same_document(app, user_1):
+    user_1 = User.find_by_email("test@example.com")
+    storage = get_audio_storage()
+
+    failed = add_job(user_1.user_id, "failed", 60, status="failed",
+                     expires_in=-10)
+    failed.segment_count = 1
+    # Converting the same document, it shares the content-addressed keys
+    running = ConversionJob(user_1.user_id, None, storage_key=failed.storage_key,
+                            job_id="running", status="running")
+    db.session.add(running)
+    db.session.commit()
+    part_key = segment_key(failed.storage_key, 0)
+    with tempfile.NamedTemporaryFile() as part_file:
+        storage.save_file(part_key, part_file.name)
+
+    assert delete_expired_jobs(storage, batch_size=10) == 1
+
+    assert storage.exists(part_key)
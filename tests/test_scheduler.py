@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models.conversion_job import ConversionJob
+from app.models.user import User
+from app.scheduler import dispatch_large_jobs
+from app.tasks import convert_large_pdf_to_audio, convert_pdf_to_audio, dispatch_large_conversions
+
+
+def add_large_job(user_id, job_id, minutes_ago):
+    job = ConversionJob(user_id, f"/tmp/{job_id}.pdf", job_id=job_id,
+                        page_count=500, size_class="large")
+    job.created_on = datetime.now() - timedelta(minutes=minutes_ago)
+    db.session.add(job)
+    db.session.commit()
+
+
+def test_large_jobs_are_dispatched_round_robin_by_user(app, user_1):
+    user_1 = User.find_by_email("test@example.com")
+    user_2 = User("Other User", "other@example.com", "hash", None, None)
+    db.session.add(user_2)
+    db.session.commit()
+
+    # User 1 uploaded three documents before user 2 uploaded one
+    add_large_job(user_1.user_id, "a1", 30)
+    add_large_job(user_1.user_id, "a2", 20)
+    add_large_job(user_1.user_id, "a3", 10)
+    add_large_job(user_2.user_id, "b1", 5)
+
+    sent = []
+
+    assert dispatch_large_jobs(2, sent.append) == ["a1", "b1"]
+
+    db.session.get(ConversionJob, "a1").status = "finished"
+    db.session.commit()
+
+    assert dispatch_large_jobs(2, sent.append) == ["a2"]
+    assert dispatch_large_jobs(2, sent.append) == []
+    assert sent == ["a1", "b1", "a2"]
+
+
+def test_convert_pdf_routes_by_page_count(app, client, user_1, stub_broker):
+    with client:
+        client.post("/login", json={
+            "email": "test@example.com",
+            "password": "password"
+        })
+
+        def submit():
+            with open("tests/static/scalability 1.pdf", "rb") as pdf_file:
+                return client.post("/users/convert-pdf-to-audio",
+                                   data={"file": (pdf_file, "scalability 1.pdf")},
+                                   content_type='multipart/form-data')
+
+        submit()
+
+        assert stub_broker.queues[convert_pdf_to_audio.queue_name].qsize() == 1
+
+        app.config["CONVERSION_SMALL_MAX_PAGES"] = 0
+        job_id = submit().get_json()["job_id"]
+
+        dispatch_large_conversions()
+
+        assert db.session.get(ConversionJob, job_id).size_class == "large"
+        assert stub_broker.queues[convert_large_pdf_to_audio.queue_name].qsize() == 1
+
+
+def test_waiting_large_jobs_count_towards_queue_depth(app, client, user_1, stub_broker):
+    app.config["CONVERSION_MAX_QUEUE_DEPTH"] = 2
+    user_id = User.find_by_email("test@example.com").user_id
+    add_large_job(user_id, "a1", 10)
+    add_large_job(user_id, "a2", 5)
+
+    with client:
+        client.post("/login", json={
+            "email": "test@example.com",
+            "password": "password"
+        })
+
+        with open("tests/static/scalability 1.pdf", "rb") as pdf_file:
+            response = client.post("/users/convert-pdf-to-audio",
+                                   data={"file": (pdf_file, "scalability 1.pdf")},
+                                   content_type='multipart/form-data')
+
+        assert response.status_code == 503
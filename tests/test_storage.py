@@ -0,0 +1,31 @@
+from io import BytesIO
+from app.storage import LocalAudioStorage, audio_key, document_hash
+
+
+def test_audio_key_depends_on_document_and_settings():
+    pdf_hash = document_hash(BytesIO(b"%PDF-1.4 lecture"))
+
+    assert audio_key(pdf_hash) == audio_key(pdf_hash)
+    assert audio_key(pdf_hash) != audio_key(pdf_hash, rate=150)
+    assert audio_key(pdf_hash) != audio_key(
+        document_hash(BytesIO(b"%PDF-1.4 other lecture")))
+
+
+def test_local_storage_save_and_delete(tmp_path):
+    storage = LocalAudioStorage(str(tmp_path / "audio"))
+    source = tmp_path / "tts.mp3"
+    source.write_bytes(b"audio")
+    key = audio_key(document_hash(BytesIO(b"%PDF-1.4")))
+
+    storage.save_file(key, str(source))
+
+    assert storage.exists(key)
+    with storage.open(key) as audio_file:
+        assert audio_file.read() == b"audio"
+    # No temp files are left behind next to the stored file
+    assert [p.name for p in (tmp_path / "audio" / key[:2]).iterdir()] == [
+        f"{key}.mp3"]
+
+    storage.delete(key)
+
+    assert not storage.exists(key)
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.synthesis import TTSEngineManager, iter_chunks, split_text, synthesize_segments
+
+
+def test_split_text_keeps_chunks_under_limit():
+    text = "First sentence. Second sentence!\n\n" + "Third one? " * 50
+
+    chunks = split_text(text, max_chars=100)
+
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_split_text_packs_short_paragraphs_together():
+    chunks = split_text("One.\n\nTwo.\n\nThree.", max_chars=100)
+
+    assert chunks == ["One. Two. Three."]
+
+
+def test_split_text_ignores_blank_text():
+    assert split_text("  \n\n  ") == []
+
+
+def test_parallel_segments_keep_document_order(mocker):
+    def render_chunk(chunk, voice=None, rate=None):
+        # Finish the first chunks last
+        time.sleep(0.01 * (5 - int(chunk)))
+        return chunk
+
+    mocker.patch("app.synthesis.render_pooled", side_effect=render_chunk)
+    mocker.patch("app.synthesis.get_executor",
+                 return_value=ThreadPoolExecutor(max_workers=3))
+
+    segments = synthesize_segments(["0", "1", "2", "3", "4"], workers=3)
+
+    assert list(segments) == ["0", "1", "2", "3", "4"]
+
+
+def test_engine_manager_reuses_and_replaces_broken_engine(mocker):
+    engine = mocker.Mock()
+    manager = TTSEngineManager(factory=mocker.Mock(return_value=engine))
+
+    assert manager.get() is manager.get()
+    assert manager.created == 1
+
+    engine.getProperty.side_effect = RuntimeError("driver died")
+    manager.get()
+
+    assert manager.created == 2
+
+
+def test_iter_chunks_matches_split_text_across_pages():
+    pages = ["First page ends mid sen", "tence. Second page. " * 20, ""]
+
+    chunks = list(iter_chunks(pages, max_chars=100))
+
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks).split() == "".join(pages).split()
+
+
+def test_iter_chunks_yields_one_chunk_for_empty_document():
+    assert list(iter_chunks(["", " "])) == [""]
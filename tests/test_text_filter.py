@@ -0,0 +1,39 @@
+from app.text_filter import TextFilter, filter_pages, filter_text
+
+
+def test_filter_text_removes_headings_dates_times_and_page_numbers():
+    text = "Chapter 1: Intro\nOn 05/27/24 at 3:15 PM we met. Page 4 of 10"
+
+    assert filter_text(text) == "On  at  we met. "
+
+
+def test_filter_text_repairs_hyphenation_and_ligatures():
+    text = "scal-\nability of the ﬁle\n12\nnext page"
+
+    assert filter_text(text) == "scalability of the file\nnext page"
+
+
+def test_custom_rules_are_applied_in_one_pass():
+    text_filter = TextFilter(rules=[])
+    text_filter.add_rule("draft", r"DRAFT\s*")
+    text_filter.add_rule("ampersand", "&", " and ")
+
+    assert text_filter.apply("DRAFT Tom&Jerry") == "Tom and Jerry"
+
+
+def test_filter_pages_drops_running_headers_and_footers():
+    pages = [f"The Long Book\nBody of page {n}.\nChapter Two - {n}"
+             for n in range(1, 7)]
+    pages[3] = "A page without a header.\nIts last line stays."
+
+    assert list(filter_pages(pages)) == [
+        f"Body of page {n}." for n in (1, 2, 3)
+    ] + ["A page without a header.\nIts last line stays."] + [
+        f"Body of page {n}." for n in (5, 6)
+    ]
+
+
+def test_filter_pages_keeps_lines_of_short_documents():
+    pages = ["The Long Book\nFirst page.", "The Long Book\nSecond page."]
+
+    assert list(filter_pages(pages)) == pages
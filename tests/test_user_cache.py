@@ -0,0 +1,83 @@
+from app import db
+from app.models.user import User
+from app.user_cache import UserCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def mget(self, *keys):
+        return [self.values.get(key) for key in keys]
+
+    def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+def test_user_cache_evicts_least_recently_used():
+    user_cache = UserCache(max_entries=2)
+    user_cache.set(1, {"user_id": 1})
+    user_cache.set(2, {"user_id": 2})
+    user_cache.get(1)
+    user_cache.set(3, {"user_id": 3})
+
+    assert user_cache.get(1) == {"user_id": 1}
+    assert user_cache.get(2) is None
+
+
+def test_user_cache_falls_back_to_redis_and_invalidates_both_tiers():
+    redis_client = FakeRedis()
+    UserCache(redis_client=redis_client).set(1, {"user_id": 1})
+    user_cache = UserCache(redis_client=redis_client)
+
+    assert user_cache.get(1) == {"user_id": 1}
+
+    user_cache.invalidate(1)
+
+    assert user_cache.get(1) is None
+    assert list(redis_client.values) == ["soundable:user:1:generation"]
+
+
+def test_user_cache_drops_rows_read_before_an_invalidation():
+    redis_client = FakeRedis()
+    user_cache = UserCache(redis_client=redis_client)
+    other_process = UserCache(redis_client=redis_client)
+
+    # A load reads the row, then the password changes before it is cached
+    generation = user_cache.generation(1)
+    user_cache.invalidate(1)
+    user_cache.set(1, {"password": "old"}, generation)
+
+    assert user_cache.get(1) is None
+    assert other_process.get(1) is None
+
+    # The same race with the invalidation in another process
+    generation = user_cache.generation(1)
+    other_process.invalidate(1)
+    user_cache.set(1, {"password": "old"}, generation)
+
+    assert other_process.get(1) is None
+
+
+def test_user_from_cache_is_attached_to_session(app, user_1):
+    db_user = User.query.filter_by(email="test@example.com").first()
+    user_id, password, row = db_user.user_id, db_user.password, db_user.to_cache()
+    db.session.expunge_all()
+
+    cached_user = User.from_cache(row)
+
+    assert cached_user in db.session
+    assert cached_user.user_id == user_id
+    assert cached_user.email == "test@example.com"
+    # The password hash isn't cached, it is loaded on access
+    assert cached_user.password == password
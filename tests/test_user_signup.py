@@ -0,0 +1,44 @@
+from app import mail
+from app.tasks import send_emails
+
+
+def test_signup_rejects_email_that_differs_only_in_case(client, user_1):
+    response = client.post("/signup", json={
+        "name": "Another User",
+        "email": "Test@Example.com",
+        "password": "password",
+        "confirm_password": "password"
+    })
+
+    assert response.status_code == 409
+
+
+def test_login_is_case_insensitive(client, user_1):
+    response = client.post("/login", json={
+        "email": "TEST@example.com",
+        "password": "password"
+    })
+
+    assert response.status_code == 200
+
+
+def test_signup_sends_verification_email_from_mail_worker(app, client, stub_broker, stub_worker):
+    app.extensions["mail"].default_sender = "noreply@example.com"
+
+    with mail.record_messages() as outbox:
+        response = client.post("/signup", json={
+            "name": "New User",
+            "email": "new@example.com",
+            "password": "password",
+            "confirm_password": "password"
+        })
+
+        assert response.status_code == 201
+        assert outbox == []
+
+        stub_broker.join(send_emails.queue_name)
+        stub_worker.join()
+
+    assert len(outbox) == 1
+    assert outbox[0].recipients == ["new@example.com"]
+    assert "/verify-email/" in outbox[0].body